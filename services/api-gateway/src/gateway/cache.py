@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple, Set, Tuple
+
+from gateway.config import settings
+from gateway.metrics import LatencyStats
+
+
+class CachedResponse(NamedTuple):
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+class _Entry(NamedTuple):
+    response: CachedResponse
+    tags: Tuple[Hashable, ...]
+    stored_at: float
+
+
+_flights = itertools.count()
+
+
+class _Fill:
+    """An upstream read in progress, shared by every concurrent reader of the key.
+
+    Marked stale if one of its tags is invalidated meanwhile. Readers arriving after
+    that get a new fill (and `flight`), so they never share the read that predates
+    the change.
+    """
+
+    __slots__ = ("key", "tags", "stale", "readers", "done", "flight")
+
+    def __init__(self, key: Hashable, tags: Tuple[Hashable, ...]) -> None:
+        self.key = key
+        self.tags = tags
+        self.stale = False
+        self.readers = 0
+        self.done = False
+        self.flight = next(_flights)
+
+
+class ResponseCache:
+    """Bounded LRU of upstream responses, dropped by tag when an event says they changed.
+
+    Serves nothing while `live` is false, i.e. while no invalidation feed is attached.
+    """
+
+    def __init__(self, max_entries: int, ttl_sec: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.live = False
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._by_tag: Dict[Hashable, Set[Hashable]] = {}
+        self._fills: Dict[Hashable, Set[_Fill]] = {}
+        # The fill new readers of a key join, until it goes stale.
+        self._pending: Dict[Hashable, _Fill] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.stale_fills = 0
+        self.invalidated = 0
+        self.evictions = 0
+        self.expired = 0
+        self.hit_age = LatencyStats()
+        self.event_lag = LatencyStats()
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None or not self.live:
+            self.misses += 1
+            return None
+        age = time.monotonic() - entry.stored_at
+        if age > self.ttl_sec:
+            self._drop(key)
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.hit_age.observe(age)
+        return entry.response
+
+    def begin(self, key: Hashable, tags: Tuple[Hashable, ...]) -> _Fill:
+        fill = self._pending.get(key)
+        if fill is None or fill.stale:
+            fill = self._pending[key] = _Fill(key, tags)
+            for tag in tags:
+                self._fills.setdefault(tag, set()).add(fill)
+        fill.readers += 1
+        return fill
+
+    def finish(self, fill: _Fill, response: CachedResponse | None) -> None:
+        fill.readers -= 1
+        if not fill.readers:
+            if self._pending.get(fill.key) is fill:
+                del self._pending[fill.key]
+            for tag in fill.tags:
+                fills = self._fills.get(tag)
+                if fills is not None:
+                    fills.discard(fill)
+                    if not fills:
+                        del self._fills[tag]
+        if response is None or not self.live or fill.done:
+            return
+        fill.done = True
+        if fill.stale:
+            # Invalidated while the upstream read was in flight: it may predate the change.
+            self.stale_fills += 1
+            return
+        self._drop(fill.key)
+        self._entries[fill.key] = _Entry(response, fill.tags, time.monotonic())
+        for tag in fill.tags:
+            self._by_tag.setdefault(tag, set()).add(fill.key)
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *tags: Hashable) -> None:
+        for tag in tags:
+            for fill in self._fills.get(tag, ()):
+                fill.stale = True
+            for key in list(self._by_tag.get(tag, ())):
+                self._drop(key)
+                self.invalidated += 1
+
+    def clear(self) -> None:
+        for fills in self._fills.values():
+            for fill in fills:
+                fill.stale = True
+        self._entries.clear()
+        self._by_tag.clear()
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "live": self.live,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "stores": self.stores,
+            "stale_fills": self.stale_fills,
+            "invalidated": self.invalidated,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            # Age of the entries served, and how late invalidation events arrive after the change.
+            "hit_age": self.hit_age.snapshot(),
+            "event_lag": self.event_lag.snapshot(),
+        }
+
+
+order_cache = ResponseCache(settings.response_cache_max_entries, settings.response_cache_ttl_sec)
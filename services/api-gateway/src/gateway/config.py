@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,6 +8,42 @@ class Settings(BaseSettings):
 
     orders_service_url: str = "http://orders:8000"
     payments_service_url: str = "http://payments:8000"
+    # order.status events on the ws exchange drive response cache invalidation and status waits.
+    rabbitmq_url: str | None = None
+    exchange_ws: str = "gozon.ws.topic"
+    events_retry_sec: float = 5.0
+
+    # One pooled keep-alive client per upstream, opened for the app lifetime.
+    upstream_max_connections: int = 200
+    upstream_max_keepalive_connections: int = 50
+    upstream_keepalive_expiry_sec: float = 30.0
+    upstream_timeout_sec: float = 10.0
+    upstream_connect_timeout_sec: float = 2.0
+    # How long a request waits for a free pooled connection before failing.
+    upstream_pool_timeout_sec: float = 5.0
+    # HTTP/2 is negotiated over TLS only; plain http upstreams stay on HTTP/1.1.
+    upstream_http2: bool = False
+    # Stream upstream bodies to the client as is; false parses and re-encodes JSON.
+    proxy_passthrough: bool = True
+    # Order reads are cached per user and dropped on order.status events; the TTL is a safety net.
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 10_000
+    response_cache_ttl_sec: float = 300.0
+    # Routes (by name) whose identical concurrent GETs share one upstream call.
+    singleflight_routes: List[str] = ["get_balance", "list_orders", "get_order"]
+    # Order status sockets share a few multiplexed upstream connections to orders-service.
+    ws_mux_connections: int = 2
+    ws_mux_reconnect_sec: float = 1.0
+    # A client socket that cannot take an event within this time is closed.
+    ws_send_timeout_sec: float = 5.0
+    # Events queued per client socket; when full, "drop" the oldest or "disconnect" the client.
+    ws_send_queue_size: int = 64
+    ws_slow_consumer_policy: str = "drop"
+    # Long-polls and SSE streams of order status are served from the event feed.
+    order_wait_default_sec: float = 30.0
+    order_wait_max_sec: float = 120.0
+    order_sse_keepalive_sec: float = 15.0
+    order_waiter_queue_size: int = 16
 
 
 settings = Settings()
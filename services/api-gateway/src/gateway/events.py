@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timezone
+from uuid import UUID
+
+import aio_pika
+from aio_pika import ExchangeType
+from aio_pika.abc import AbstractIncomingMessage
+
+from gateway.cache import ResponseCache
+from gateway.config import settings
+from gateway.waiters import OrderWaiters
+
+
+class OrderEvents:
+    """Feeds order.status events from the ws exchange into cache invalidation and status waiters.
+
+    The cache and the waiters only work while the feed is connected; a lost connection
+    may have lost events, so the cache is cleared both when it drops and when it comes
+    back, and pending waits are ended.
+    """
+
+    def __init__(self, cache: ResponseCache, waiters: OrderWaiters) -> None:
+        self.cache = cache
+        self.waiters = waiters
+        self.connection: aio_pika.abc.AbstractRobustConnection | None = None
+        self.received = 0
+        self.malformed = 0
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set() and self.connection is None:
+            try:
+                await self._connect()
+            except Exception:
+                await asyncio.sleep(settings.events_retry_sec)
+
+    async def _connect(self) -> None:
+        connection = await aio_pika.connect_robust(settings.rabbitmq_url)
+        try:
+            channel = await connection.channel()
+            exchange = await channel.declare_exchange(settings.exchange_ws, ExchangeType.TOPIC, durable=True)
+            queue = await channel.declare_queue("", exclusive=True, auto_delete=True)
+            # Every order.status.<shard>.<order_id>: any order may be cached here.
+            await queue.bind(exchange, routing_key="order.status.#")
+            await queue.consume(self._on_message, no_ack=True)
+        except Exception:
+            await connection.close()
+            raise
+        connection.close_callbacks.add(self._on_lost)
+        connection.reconnect_callbacks.add(self._on_restored)
+        self.connection = connection
+        self.cache.live = True
+        self.waiters.live = True
+
+    async def close(self) -> None:
+        self.cache.live = False
+        self.waiters.live = False
+        self.waiters.wake_all()
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    def _on_lost(self, *_) -> None:
+        self.cache.live = False
+        self.cache.clear()
+        self.waiters.live = False
+        self.waiters.wake_all()
+
+    def _on_restored(self, *_) -> None:
+        self.cache.clear()
+        self.cache.live = True
+        self.waiters.live = True
+
+    async def _on_message(self, message: AbstractIncomingMessage) -> None:
+        try:
+            raw = message.body.decode("utf-8")
+            payload = json.loads(raw)
+            order_id = str(UUID(payload["order_id"]))
+            user_id = int(payload["user_id"])
+        except Exception:
+            self.malformed += 1
+            return
+        self.received += 1
+        self.cache.invalidate(("order", order_id), ("user", user_id))
+        self.waiters.publish(order_id, raw)
+        try:
+            changed_at = datetime.fromisoformat(payload["updated_at"])
+            self.cache.event_lag.observe(max(0.0, (datetime.now(timezone.utc) - changed_at).total_seconds()))
+        except Exception:
+            pass
+
+    def snapshot(self) -> dict:
+        return {"connected": self.connection is not None, "received": self.received, "malformed": self.malformed}
@@ -1,35 +1,61 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict
+import json
+from contextlib import asynccontextmanager
+from typing import Any, Set
+from uuid import UUID
 
 import httpx
-import websockets
-from fastapi import FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket
 from fastapi.responses import JSONResponse
+from gateway.cache import order_cache
 from gateway.config import settings
-
-app = FastAPI(title="API Gateway", version="1.0.0")
-
-
-async def _proxy(
-    method: str,
-    upstream_url: str,
-    path: str,
-    headers: Dict[str, str],
-    json_body: Any | None = None,
-    params: Dict[str, Any] | None = None,
-):
-    url = f"{upstream_url}{path}"
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.request(method, url, headers=headers, json=json_body, params=params)
-    return resp
+from gateway.events import OrderEvents
+from gateway.mux import OrderStatusMux, user_key
+from gateway.proxy import router as proxy_router
+from gateway.singleflight import upstream_flights
+from gateway.status import router as status_router
+from gateway.upstream import upstreams
+from gateway.waiters import order_waiters
+
+
+order_events = OrderEvents(order_cache, order_waiters)
+order_mux = OrderStatusMux(
+    f"{settings.orders_service_url.replace('http://', 'ws://').replace('https://', 'wss://')}/ws/mux",
+    settings.ws_mux_connections,
+    settings.ws_mux_reconnect_sec,
+    settings.ws_send_timeout_sec,
+    settings.ws_send_queue_size,
+    settings.ws_slow_consumer_policy,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for upstream in upstreams.values():
+        upstream.start()
+    order_mux.start()
+    stop = asyncio.Event()
+    events_task = None
+    if settings.rabbitmq_url:
+        events_task = asyncio.create_task(order_events.run(stop))
+    try:
+        yield
+    finally:
+        stop.set()
+        if events_task:
+            events_task.cancel()
+            await asyncio.gather(events_task, return_exceptions=True)
+        await order_events.close()
+        await order_mux.close()
+        for upstream in upstreams.values():
+            await upstream.close()
 
 
-def _user_headers(x_user_id: int | None) -> Dict[str, str]:
-    if x_user_id is None:
-        raise HTTPException(status_code=400, detail="X-User-Id header is required")
-    return {"X-User-Id": str(x_user_id)}
+app = FastAPI(title="API Gateway", version="1.0.0", lifespan=lifespan)
+app.include_router(status_router)
+app.include_router(proxy_router)
 
 
 @app.exception_handler(httpx.HTTPError)
@@ -37,65 +63,94 @@ async def httpx_error_handler(_: Request, exc: httpx.HTTPError):
     return JSONResponse(status_code=502, content={"detail": f"Upstream error: {exc!s}"})
 
 
-@app.post("/accounts")
-async def create_account(x_user_id: int | None = Header(default=None, alias="X-User-Id")):
-    resp = await _proxy("POST", settings.payments_service_url, "/accounts", _user_headers(x_user_id))
-    return JSONResponse(status_code=resp.status_code, content=resp.json())
+@app.get("/internal/upstreams")
+async def get_upstream_stats():
+    return {name: upstream.snapshot() for name, upstream in upstreams.items()}
 
 
-@app.post("/accounts/topup")
-async def topup_account(payload: dict, x_user_id: int | None = Header(default=None, alias="X-User-Id")):
-    resp = await _proxy("POST", settings.payments_service_url, "/accounts/topup", _user_headers(x_user_id), json_body=payload)
-    return JSONResponse(status_code=resp.status_code, content=resp.json())
+@app.get("/internal/cache")
+async def get_cache_stats():
+    return {**order_cache.snapshot(), "events": order_events.snapshot()}
 
 
-@app.get("/accounts/balance")
-async def get_balance(x_user_id: int | None = Header(default=None, alias="X-User-Id")):
-    resp = await _proxy("GET", settings.payments_service_url, "/accounts/balance", _user_headers(x_user_id))
-    return JSONResponse(status_code=resp.status_code, content=resp.json())
+@app.get("/internal/waiters")
+async def get_waiter_stats():
+    return order_waiters.snapshot()
 
 
-@app.post("/orders")
-async def create_order(payload: dict, x_user_id: int | None = Header(default=None, alias="X-User-Id")):
-    resp = await _proxy("POST", settings.orders_service_url, "/orders", _user_headers(x_user_id), json_body=payload)
-    return JSONResponse(status_code=resp.status_code, content=resp.json())
+@app.get("/internal/singleflight")
+async def get_singleflight_stats():
+    return upstream_flights.snapshot()
 
 
-@app.get("/orders")
-async def list_orders(x_user_id: int | None = Header(default=None, alias="X-User-Id")):
-    resp = await _proxy("GET", settings.orders_service_url, "/orders", _user_headers(x_user_id))
-    return JSONResponse(status_code=resp.status_code, content=resp.json())
+@app.get("/internal/ws")
+async def get_ws_stats():
+    return order_mux.snapshot()
 
 
-@app.get("/orders/{order_id}")
-async def get_order(order_id: str, x_user_id: int | None = Header(default=None, alias="X-User-Id")):
-    resp = await _proxy("GET", settings.orders_service_url, f"/orders/{order_id}", _user_headers(x_user_id))
-    return JSONResponse(status_code=resp.status_code, content=resp.json())
+def _order_id(raw: Any) -> str | None:
+    try:
+        return str(UUID(str(raw)))
+    except ValueError:
+        return None
+
+
+async def _serve_key(websocket: WebSocket, key: str) -> None:
+    order_mux.clients += 1
+    await order_mux.subscribe(key, websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except Exception:
+        pass
+    finally:
+        order_mux.clients -= 1
+        await order_mux.unsubscribe(key, websocket)
+
+
+@app.websocket("/orders/ws")
+async def ws_user_orders(websocket: WebSocket, user_id: int):
+    """Status events of all the user's orders over one socket."""
+    await websocket.accept()
+    await _serve_key(websocket, user_key(user_id))
 
 
 @app.websocket("/orders/{order_id}/ws")
 async def ws_order_status(websocket: WebSocket, order_id: str):
     await websocket.accept()
-    upstream = f"{settings.orders_service_url.replace('http://', 'ws://').replace('https://', 'wss://')}/ws/orders/{order_id}"
-    try:
-        async with websockets.connect(upstream) as upstream_ws:
-            async def forward_upstream():
-                async for msg in upstream_ws:
-                    await websocket.send_text(msg)
-
-            async def drain_client():
-                while True:
-                    await websocket.receive_text()
-
-            t1 = asyncio.create_task(forward_upstream())
-            t2 = asyncio.create_task(drain_client())
-            done, pending = await asyncio.wait({t1, t2}, return_when=asyncio.FIRST_EXCEPTION)
-            for p in pending:
-                p.cancel()
-    except WebSocketDisconnect:
+    key = _order_id(order_id)
+    if key is None:
+        await websocket.close(code=1008)
         return
+    await _serve_key(websocket, key)
+
+
+@app.websocket("/ws/mux")
+async def ws_mux(websocket: WebSocket):
+    """Same protocol as orders-service /ws/mux, served from the shared upstream sockets."""
+    await websocket.accept()
+    order_mux.clients += 1
+    subscribed: Set[str] = set()
+    try:
+        while True:
+            try:
+                msg = json.loads(await websocket.receive_text())
+                op = msg["op"]
+                key = _order_id(msg["order_id"]) if "order_id" in msg else user_key(int(msg["user_id"]))
+                last_event_id = int(msg["last_event_id"]) if msg.get("last_event_id") is not None else None
+            except (ValueError, KeyError, TypeError):
+                continue
+            if key is None:
+                continue
+            if op == "subscribe" and key not in subscribed:
+                subscribed.add(key)
+                await order_mux.subscribe(key, websocket, last_event_id)
+            elif op == "unsubscribe" and key in subscribed:
+                subscribed.discard(key)
+                await order_mux.unsubscribe(key, websocket)
     except Exception:
-        try:
-            await websocket.close()
-        except Exception:
-            pass
+        pass
+    finally:
+        order_mux.clients -= 1
+        for key in subscribed:
+            await order_mux.unsubscribe(key, websocket)
@@ -0,0 +1,304 @@
+"""Multiplexed order status sockets.
+
+Copied to services/frontend/src/frontend/mux.py, since each service builds from
+its own context. Change both together; only this docstring differs.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from collections import deque
+from typing import Any, Deque, Dict, List, Set
+
+import websockets
+from fastapi import WebSocket
+
+
+_CLOSE = None
+
+
+def user_key(user_id: int) -> str:
+    """Subscription key for all orders of a user; order keys are the order ids themselves."""
+    return f"user:{user_id}"
+
+
+def _op_message(op: str, key: str, last_event_id: int | None = None) -> str:
+    if key.startswith("user:"):
+        msg: Dict[str, Any] = {"op": op, "user_id": int(key[len("user:"):])}
+    else:
+        msg = {"op": op, "order_id": key}
+    if last_event_id is not None:
+        msg["last_event_id"] = last_event_id
+    return json.dumps(msg)
+
+
+class _UpstreamLink:
+    """One multiplexed upstream socket; re-subscribes its share of orders after every reconnect."""
+
+    def __init__(self, mux: "OrderStatusMux", index: int) -> None:
+        self.mux = mux
+        self.index = index
+        self.ws: Any = None
+        self.connects = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def send(self, op: str, key: str, last_event_id: int | None = None) -> None:
+        ws = self.ws
+        if ws is None:
+            # Not connected: the resubscribe on connect covers it.
+            return
+        try:
+            await ws.send(_op_message(op, key, last_event_id))
+        except Exception:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with websockets.connect(self.mux.url) as ws:
+                    self.ws = ws
+                    self.connects += 1
+                    # Resume from the last event seen: orders replays the gap when it can.
+                    for key in [k for k in self.mux._subscribers if self.mux._link(k) is self]:
+                        await ws.send(_op_message("subscribe", key, self.mux._last_seq.get(key)))
+                    async for raw in ws:
+                        self.mux._dispatch(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self.ws = None
+            await asyncio.sleep(self.mux.reconnect_sec)
+
+
+class _Client:
+    """A local client socket: how many keys it holds and its pending events.
+
+    The queue and writer task only exist while there is something to send.
+    """
+
+    __slots__ = ("websocket", "keys", "pending", "writer", "evicted")
+
+    def __init__(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        self.keys = 0
+        self.pending: Deque[str | None] | None = None
+        self.writer: asyncio.Task | None = None
+        self.evicted = False
+
+
+class OrderStatusMux:
+    """Fans order.status events from a few shared upstream sockets out to many client sockets.
+
+    Sockets subscribe to an order (key = order id) or to all orders of a user
+    (`user_key`). Upstream subscribe/unsubscribe is sent only for the first/last
+    local subscriber of a key; the last event seen per order is kept so a late
+    subscriber still gets the current status right away.
+
+    Reading an upstream socket never waits on a client: events go to a bounded
+    queue per client, drained by its own writer. A full queue drops its oldest
+    event ("drop") or closes the client ("disconnect"), as in orders-service.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        connections: int,
+        reconnect_sec: float,
+        send_timeout_sec: float,
+        queue_size: int,
+        slow_policy: str,
+    ) -> None:
+        if slow_policy not in ("drop", "disconnect"):
+            raise ValueError(f"Unknown slow consumer policy {slow_policy!r}")
+        self.url = url
+        self.reconnect_sec = reconnect_sec
+        self.send_timeout_sec = send_timeout_sec
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self._links = [_UpstreamLink(self, i) for i in range(max(1, connections))]
+        self._clients: Dict[WebSocket, _Client] = {}
+        self._subscribers: Dict[str, Set[_Client]] = {}
+        self._last: Dict[str, str] = {}
+        self._last_by_user: Dict[str, Dict[str, str]] = {}
+        self._last_seq: Dict[str, int] = {}
+        self.clients = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.dropped_clients = 0
+
+    def start(self) -> None:
+        for link in self._links:
+            link.start()
+
+    async def close(self) -> None:
+        for link in self._links:
+            await link.close()
+
+    def _link(self, key: str) -> _UpstreamLink:
+        return self._links[hash(key) % len(self._links)]
+
+    async def subscribe(self, key: str, websocket: WebSocket, last_event_id: int | None = None) -> None:
+        """`last_event_id` resumes a new key upstream; an already open key serves its last events."""
+        client = self._clients.get(websocket)
+        if client is None:
+            client = self._clients[websocket] = _Client(websocket)
+        subscribers = self._subscribers.get(key)
+        if subscribers is None:
+            self._subscribers[key] = {client}
+            client.keys += 1
+            if last_event_id is not None:
+                # Also what a reconnect resumes from until an event arrives.
+                self._last_seq[key] = last_event_id
+            await self._link(key).send("subscribe", key, last_event_id)
+            return
+        if client in subscribers:
+            return
+        subscribers.add(client)
+        client.keys += 1
+        if key in self._last_by_user:
+            last = list(self._last_by_user[key].values())
+        else:
+            last = [self._last[key]] if key in self._last else []
+        # Not subject to the queue bound, like any snapshot.
+        for raw in last:
+            self._push(client, raw)
+
+    async def unsubscribe(self, key: str, websocket: WebSocket) -> None:
+        client = self._clients.get(websocket)
+        subscribers = self._subscribers.get(key)
+        if client is None or subscribers is None or client not in subscribers:
+            return
+        subscribers.discard(client)
+        client.keys -= 1
+        if not client.keys:
+            del self._clients[websocket]
+            if client.writer is not None and client.writer is not asyncio.current_task():
+                client.writer.cancel()
+        if not subscribers:
+            del self._subscribers[key]
+            self._last.pop(key, None)
+            self._last_by_user.pop(key, None)
+            self._last_seq.pop(key, None)
+            await self._link(key).send("unsubscribe", key)
+
+    def _dispatch(self, raw: str) -> None:
+        try:
+            payload = json.loads(raw)
+            order_id, user = payload["order_id"], user_key(payload["user_id"])
+        except Exception:
+            return
+        order_subscribers = self._subscribers.get(order_id)
+        user_subscribers = self._subscribers.get(user)
+        if not order_subscribers and not user_subscribers:
+            return
+        seq = payload.get("seq")
+        if order_subscribers:
+            self._last[order_id] = raw
+            if seq is not None:
+                self._last_seq[order_id] = seq
+        if user_subscribers:
+            self._last_by_user.setdefault(user, {})[order_id] = raw
+            if seq is not None:
+                self._last_seq[user] = seq
+        # A socket subscribed both ways still gets the event once.
+        for client in set(order_subscribers or ()) | set(user_subscribers or ()):
+            self._enqueue(client, raw)
+
+    def _enqueue(self, client: _Client, raw: str) -> None:
+        if client.evicted:
+            return
+        if client.pending is not None and len(client.pending) >= self.queue_size:
+            if self.slow_policy == "disconnect":
+                # The writer closes the socket once it gets the marker (or its current send times out).
+                client.evicted = True
+                self.evicted += 1
+                client.pending.clear()
+                self._push(client, _CLOSE)
+                return
+            client.pending.popleft()
+            self.dropped += 1
+        self._push(client, raw)
+
+    def _push(self, client: _Client, raw: str | None) -> None:
+        if client.pending is None:
+            client.pending = deque()
+        client.pending.append(raw)
+        if client.writer is None:
+            client.writer = asyncio.create_task(self._writer(client))
+
+    async def _writer(self, client: _Client) -> None:
+        """Drains the client's queue and exits when it is empty."""
+        websocket = client.websocket
+        pending = client.pending
+        assert pending is not None
+        try:
+            while pending:
+                raw = pending.popleft()
+                if raw is _CLOSE:
+                    break
+                try:
+                    await asyncio.wait_for(websocket.send_text(raw), self.send_timeout_sec)
+                except Exception:
+                    self.dropped_clients += 1
+                    break
+                self.delivered += 1
+            else:
+                client.pending = None
+                return
+        finally:
+            client.writer = None
+        # Stalled, gone or evicted: its handler notices the close and unsubscribes.
+        evicted = client.evicted
+        client.evicted = True
+        try:
+            # 1013: try again later.
+            await websocket.close(code=1013 if evicted else 1000)
+        except Exception:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        subscriptions = sum(len(s) for s in self._subscribers.values())
+        clients = list(self._clients.values())
+        depths = [len(c.pending) for c in clients if c.pending is not None]
+        bookkeeping = (
+            sys.getsizeof(self._subscribers)
+            + sys.getsizeof(self._clients)
+            + sum(sys.getsizeof(c) + (sys.getsizeof(c.pending) if c.pending is not None else 0) for c in clients)
+            + sys.getsizeof(self._last)
+            + sum(sys.getsizeof(k) + sys.getsizeof(s) for k, s in self._subscribers.items())
+            + sum(sys.getsizeof(v) for v in self._last.values())
+            + sum(sys.getsizeof(d) + sum(sys.getsizeof(v) for v in d.values()) for d in self._last_by_user.values())
+        )
+        links: List[Dict[str, Any]] = [
+            {"index": link.index, "connected": link.ws is not None, "connects": link.connects} for link in self._links
+        ]
+        return {
+            "upstream": links,
+            "clients": self.clients,
+            "orders": sum(1 for k in self._subscribers if not k.startswith("user:")),
+            "users": sum(1 for k in self._subscribers if k.startswith("user:")),
+            "subscriptions": subscriptions,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "dropped_clients": self.dropped_clients,
+            "slow_policy": self.slow_policy,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "bookkeeping_bytes": bookkeeping,
+            "bytes_per_subscription": round(bookkeeping / subscriptions, 1) if subscriptions else None,
+        }
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Hashable, List, NamedTuple, Tuple
+from uuid import UUID
+
+import httpx
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from gateway.cache import CachedResponse, order_cache
+from gateway.config import settings
+from gateway.singleflight import upstream_flights
+from gateway.upstream import Upstream, orders_upstream, payments_upstream
+
+# Response headers that describe the body and are safe to pass on; hop-by-hop
+# headers (connection, transfer-encoding, ...) are the gateway's own business.
+_PASSTHROUGH_HEADERS = ("content-type", "content-length", "content-encoding", "cache-control", "etag", "location")
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    path: str
+    upstream: Upstream
+    # Upstream path template, filled from the gateway path parameters.
+    upstream_path: str
+    # Cache 200 responses per user, tagged by "order" (the order_id path parameter) or "user".
+    cache: str | None = None
+    # Drop the user's cached reads once the upstream has answered.
+    invalidates: bool = False
+    # What makes two concurrent GETs identical for single-flight (see SINGLEFLIGHT_ROUTES):
+    # "user_id", "path", "query" or "header:<name>".
+    coalesce_key: Tuple[str, ...] = ("user_id", "path", "query")
+    # Always stream, whatever PROXY_PASSTHROUGH says (non-JSON or unbounded bodies).
+    stream_only: bool = False
+
+
+ROUTES: List[Route] = [
+    Route("create_account", "POST", "/accounts", payments_upstream, "/accounts"),
+    Route("topup_account", "POST", "/accounts/topup", payments_upstream, "/accounts/topup"),
+    Route("get_balance", "GET", "/accounts/balance", payments_upstream, "/accounts/balance"),
+    Route("create_order", "POST", "/orders", orders_upstream, "/orders", invalidates=True),
+    Route("create_orders_batch", "POST", "/orders/batch", orders_upstream, "/orders/batch", invalidates=True),
+    Route("list_orders", "GET", "/orders", orders_upstream, "/orders", cache="user"),
+    Route("export_orders", "GET", "/orders/export", orders_upstream, "/orders/export", stream_only=True),
+    Route("get_order", "GET", "/orders/{order_id}", orders_upstream, "/orders/{order_id}", cache="order"),
+]
+
+
+def _upstream_headers(request: Request) -> Dict[str, str]:
+    x_user_id = request.headers.get("x-user-id")
+    if x_user_id is None:
+        raise HTTPException(status_code=400, detail="X-User-Id header is required")
+    try:
+        headers = {"X-User-Id": str(int(x_user_id))}
+    except ValueError:
+        raise HTTPException(status_code=422, detail="X-User-Id must be an integer")
+    if "content-type" in request.headers:
+        headers["Content-Type"] = request.headers["content-type"]
+    # Bytes are passed through untouched, so only ask for encodings the client accepts.
+    headers["Accept-Encoding"] = request.headers.get("accept-encoding", "identity")
+    return headers
+
+
+def _response_headers(resp: httpx.Response) -> Dict[str, str]:
+    return {name: resp.headers[name] for name in _PASSTHROUGH_HEADERS if name in resp.headers}
+
+
+async def _send(route: Route, request: Request, headers: Dict[str, str], stream: bool = False) -> httpx.Response:
+    return await route.upstream.send(
+        route.method,
+        route.upstream_path.format(**request.path_params),
+        headers,
+        content=await request.body() or None,
+        params=request.query_params.multi_items(),
+        stream=stream,
+    )
+
+
+async def _passthrough(route: Route, request: Request, headers: Dict[str, str]) -> Response:
+    resp = await _send(route, request, headers, stream=True)
+    return StreamingResponse(
+        resp.aiter_raw(),
+        status_code=resp.status_code,
+        headers=_response_headers(resp),
+        background=BackgroundTask(resp.aclose),
+    )
+
+
+async def _buffered(route: Route, request: Request, headers: Dict[str, str]) -> Response:
+    resp = await _send(route, request, headers)
+    return JSONResponse(status_code=resp.status_code, content=resp.json())
+
+
+def _cache_key(route: Route, request: Request, user_id: int) -> Tuple[Hashable, Tuple[Hashable, ...]] | None:
+    if route.cache == "order":
+        try:
+            order_id = str(UUID(request.path_params["order_id"]))
+        except ValueError:
+            return None
+        tag: Hashable = ("order", order_id)
+    else:
+        tag = ("user", user_id)
+    return (route.name, user_id, tuple(sorted(request.path_params.items())), str(request.query_params)), (tag,)
+
+
+def _flight_key(route: Route, request: Request, headers: Dict[str, str]) -> Hashable:
+    parts: List[str | None] = [route.name]
+    for part in route.coalesce_key:
+        if part == "user_id":
+            parts.append(headers["X-User-Id"])
+        elif part == "path":
+            parts.append(request.url.path)
+        elif part == "query":
+            parts.append(str(request.query_params))
+        elif part.startswith("header:"):
+            parts.append(request.headers.get(part[len("header:"):]))
+        else:
+            raise ValueError(f"Unknown coalesce key part {part!r}")
+    return tuple(parts)
+
+
+async def _read(route: Route, request: Request, headers: Dict[str, str], flight: Hashable = None) -> CachedResponse:
+    """Reads the whole upstream response; identical concurrent GETs of opted-in routes share one read.
+
+    `flight` splits otherwise identical GETs, e.g. before and after a cache invalidation.
+    """
+
+    async def fetch() -> CachedResponse:
+        # The body may be handed to several clients (and cached), so keep it unencoded.
+        resp = await _send(route, request, {**headers, "Accept-Encoding": "identity"})
+        return CachedResponse(resp.status_code, _response_headers(resp), resp.content)
+
+    if _coalesced(route):
+        return await upstream_flights.do((_flight_key(route, request, headers), flight), route.name, fetch)
+    return await fetch()
+
+
+def _coalesced(route: Route) -> bool:
+    return route.method == "GET" and route.name in settings.singleflight_routes
+
+
+async def _cached(route: Route, request: Request, headers: Dict[str, str]) -> CachedResponse | None:
+    key_tags = _cache_key(route, request, int(headers["X-User-Id"]))
+    if key_tags is None:
+        return None
+    key, tags = key_tags
+    cached = order_cache.get(key)
+    if cached is not None:
+        return cached
+
+    fill = order_cache.begin(key, tags)
+    stored = None
+    try:
+        response = await _read(route, request, headers, fill.flight)
+        if response.status_code == 200:
+            stored = response
+    finally:
+        order_cache.finish(fill, stored)
+    return response
+
+
+def _handler(route: Route) -> Callable:
+    async def handler(request: Request) -> Response:
+        headers = _upstream_headers(request)
+        read = None
+        if route.cache and settings.response_cache_enabled:
+            read = await _cached(route, request, headers)
+        if read is None and _coalesced(route):
+            read = await _read(route, request, headers)
+
+        if read is not None:
+            response: Response = Response(content=read.body, status_code=read.status_code, headers=read.headers)
+        elif settings.proxy_passthrough or route.stream_only:
+            response = await _passthrough(route, request, headers)
+        else:
+            response = await _buffered(route, request, headers)
+        if route.invalidates:
+            order_cache.invalidate(("user", int(headers["X-User-Id"])))
+        return response
+
+    handler.__name__ = route.name
+    return handler
+
+
+router = APIRouter()
+for _route in ROUTES:
+    router.add_api_route(_route.path, _handler(_route), methods=[_route.method], name=_route.name)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.collapsed = 0
+        self.by_route: Dict[str, Dict[str, int]] = {}
+
+    async def do(self, key: Hashable, route: str, fn: Callable[[], Awaitable[T]]) -> T:
+        counters = self.by_route.setdefault(route, {"calls": 0, "collapsed": 0})
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            counters["calls"] += 1
+            # The call runs in its own task: a caller that goes away (client
+            # disconnect) must not cancel it for the others.
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.collapsed += 1
+            counters["collapsed"] += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.calls + self.collapsed
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "collapse_rate": round(self.collapsed / total, 4) if total else None,
+            "in_flight": len(self._calls),
+            "routes": self.by_route,
+        }
+
+
+upstream_flights = SingleFlight()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import json
+import time
+from uuid import UUID
+
+import httpx
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from gateway.config import settings
+from gateway.proxy import _response_headers, _upstream_headers
+from gateway.upstream import orders_upstream
+from gateway.waiters import order_waiters
+
+router = APIRouter()
+
+_FINAL_STATUSES = ("FINISHED", "CANCELLED")
+
+
+def _timeout(read: float | None) -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.upstream_timeout_sec,
+        read=read,
+        connect=settings.upstream_connect_timeout_sec,
+        pool=settings.upstream_pool_timeout_sec,
+    )
+
+
+def _final(message: str) -> bool:
+    return json.loads(message)["status"] in _FINAL_STATUSES
+
+
+def _sse(message: str) -> str:
+    seq = json.loads(message).get("seq")
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}event: order.status\ndata: {message}\n\n"
+
+
+async def _current(order_id: str, headers) -> httpx.Response:
+    # A zero-timeout wait answers at once with the current status, and orders-service
+    # checks the order belongs to the user. The body is read here, so keep it unencoded.
+    return await orders_upstream.send(
+        "GET", f"/orders/{order_id}/wait", {**headers, "Accept-Encoding": "identity"}, params={"timeout": 0}
+    )
+
+
+@router.get("/orders/{order_id}/wait")
+async def wait_order_status(
+    request: Request,
+    order_id: UUID,
+    timeout: float = Query(default=settings.order_wait_default_sec, ge=0, le=settings.order_wait_max_sec),
+):
+    """Long-poll: the event that makes the order final, or its current status after `timeout` seconds."""
+    headers = _upstream_headers(request)
+    if not order_waiters.live:
+        resp = await orders_upstream.send(
+            "GET",
+            f"/orders/{order_id}/wait",
+            {**headers, "Accept-Encoding": "identity"},
+            params={"timeout": timeout},
+            timeout=_timeout(timeout + settings.upstream_timeout_sec),
+        )
+        return Response(content=resp.content, status_code=resp.status_code, headers=_response_headers(resp))
+
+    key = str(order_id)
+    # Registered before the status is read, so a change in between is not missed.
+    waiter = order_waiters.add(key)
+    try:
+        resp = await _current(key, headers)
+        if resp.status_code != 200:
+            return Response(content=resp.content, status_code=resp.status_code, headers=_response_headers(resp))
+        message = resp.text
+        deadline = time.monotonic() + timeout
+        while not _final(message):
+            received = await order_waiters.next(waiter, deadline - time.monotonic())
+            if received is None:
+                break
+            message = received
+    finally:
+        order_waiters.remove(key, waiter)
+    return Response(content=message, media_type="application/json")
+
+
+@router.get("/orders/{order_id}/events")
+async def order_status_events(
+    request: Request,
+    order_id: UUID,
+    last_event_id: int | None = Query(default=None),
+    last_event_id_header: int | None = Header(default=None, alias="Last-Event-ID"),
+):
+    """Server-Sent Events: the current status, then every change until the order is final."""
+    headers = _upstream_headers(request)
+    resume = last_event_id if last_event_id is not None else last_event_id_header
+    if resume is not None or not order_waiters.live:
+        # Replays live in orders-service, so resuming streams come from there.
+        resp = await orders_upstream.send(
+            "GET",
+            f"/orders/{order_id}/events",
+            headers,
+            params={"last_event_id": resume} if resume is not None else None,
+            stream=True,
+            timeout=_timeout(None),
+        )
+        return StreamingResponse(
+            resp.aiter_raw(),
+            status_code=resp.status_code,
+            headers=_response_headers(resp),
+            background=BackgroundTask(resp.aclose),
+        )
+
+    key = str(order_id)
+    waiter = order_waiters.add(key)
+    try:
+        resp = await _current(key, headers)
+    except BaseException:
+        order_waiters.remove(key, waiter)
+        raise
+    if resp.status_code != 200:
+        order_waiters.remove(key, waiter)
+        return Response(content=resp.content, status_code=resp.status_code, headers=_response_headers(resp))
+
+    async def events():
+        message = resp.text
+        try:
+            while True:
+                yield _sse(message)
+                if _final(message):
+                    return
+                received = await order_waiters.next(waiter, settings.order_sse_keepalive_sec)
+                while received is None:
+                    if waiter.overflowed:
+                        # Events may be missing: end the stream, the client resumes with Last-Event-ID.
+                        return
+                    yield ": keepalive\n\n"
+                    received = await order_waiters.next(waiter, settings.order_sse_keepalive_sec)
+                message = received
+        finally:
+            order_waiters.remove(key, waiter)
+
+    # The generator's finally never runs if the client leaves before the first chunk.
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+        background=BackgroundTask(order_waiters.remove, key, waiter),
+    )
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict
+
+import httpx
+
+from gateway.config import settings
+from gateway.metrics import LatencyStats
+
+
+class Upstream:
+    """Pooled keep-alive HTTP client for one upstream service."""
+
+    def __init__(self, name: str, base_url: str) -> None:
+        self.name = name
+        self.base_url = base_url
+        self.client: httpx.AsyncClient | None = None
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latency = LatencyStats()
+
+    def start(self) -> None:
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(
+                max_connections=settings.upstream_max_connections,
+                max_keepalive_connections=settings.upstream_max_keepalive_connections,
+                keepalive_expiry=settings.upstream_keepalive_expiry_sec,
+            ),
+            timeout=httpx.Timeout(
+                settings.upstream_timeout_sec,
+                connect=settings.upstream_connect_timeout_sec,
+                pool=settings.upstream_pool_timeout_sec,
+            ),
+            http2=settings.upstream_http2,
+        )
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def send(
+        self,
+        method: str,
+        path: str,
+        headers: Dict[str, str],
+        content: bytes | None = None,
+        params: Any | None = None,
+        stream: bool = False,
+        timeout: httpx.Timeout | None = None,
+    ) -> httpx.Response:
+        """Sends a request; with stream=True the caller reads and closes the body."""
+        assert self.client is not None
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            request = self.client.build_request(
+                method,
+                path,
+                headers=headers,
+                content=content,
+                params=params,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            )
+            return await self.client.send(request, stream=stream)
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.latency.observe(time.perf_counter() - started)
+
+    def _pool_snapshot(self) -> Dict[str, Any]:
+        # httpcore does not expose pool counters publicly; read them best-effort.
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            "connections": len(connections),
+            "idle": idle,
+            "active": len(connections) - idle,
+            "max_connections": settings.upstream_max_connections,
+            "max_keepalive_connections": settings.upstream_max_keepalive_connections,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "http2": settings.upstream_http2,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "latency": self.latency.snapshot(),
+            "pool": self._pool_snapshot(),
+        }
+
+
+orders_upstream = Upstream("orders", settings.orders_service_url)
+payments_upstream = Upstream("payments", settings.payments_service_url)
+upstreams: Dict[str, Upstream] = {u.name: u for u in (orders_upstream, payments_upstream)}
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Set
+
+from gateway.config import settings
+
+
+class _Waiter:
+    __slots__ = ("messages", "wakeup", "overflowed")
+
+    def __init__(self) -> None:
+        self.messages: Deque[str] = deque()
+        self.wakeup: asyncio.Future | None = None
+        self.overflowed = False
+
+
+class OrderWaiters:
+    """Long-polls and SSE streams waiting on order.status events, fed by the gateway's event consumer.
+
+    A waiter is a deque and, while idle, one future: it holds no upstream connection.
+    Only usable while `live`, i.e. while the event feed is connected.
+    """
+
+    def __init__(self, queue_size: int) -> None:
+        self.queue_size = queue_size
+        self.live = False
+        self._by_order: Dict[str, Set[_Waiter]] = {}
+        self.waiters = 0
+        self.peak_waiters = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def add(self, order_id: str) -> _Waiter:
+        waiter = _Waiter()
+        self._by_order.setdefault(order_id, set()).add(waiter)
+        self.waiters += 1
+        self.peak_waiters = max(self.peak_waiters, self.waiters)
+        return waiter
+
+    def remove(self, order_id: str, waiter: _Waiter) -> None:
+        waiters = self._by_order.get(order_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.discard(waiter)
+        if not waiters:
+            del self._by_order[order_id]
+        self.waiters -= 1
+
+    def publish(self, order_id: str, raw: str) -> None:
+        for waiter in self._by_order.get(order_id, ()):
+            if len(waiter.messages) >= self.queue_size:
+                # A reader this far behind is cut off rather than buffered.
+                waiter.overflowed = True
+                self.overflows += 1
+            else:
+                waiter.messages.append(raw)
+                self.delivered += 1
+            if waiter.wakeup is not None and not waiter.wakeup.done():
+                waiter.wakeup.set_result(None)
+
+    def wake_all(self) -> None:
+        """Ends every wait, e.g. when the feed drops and events may be missed."""
+        for waiters in self._by_order.values():
+            for waiter in waiters:
+                waiter.overflowed = True
+                if waiter.wakeup is not None and not waiter.wakeup.done():
+                    waiter.wakeup.set_result(None)
+
+    async def next(self, waiter: _Waiter, timeout: float) -> str | None:
+        """The next event, or None after `timeout` seconds or once the waiter is cut off."""
+        if not waiter.messages and not waiter.overflowed:
+            waiter.wakeup = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(waiter.wakeup, max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiter.wakeup = None
+        return waiter.messages.popleft() if waiter.messages else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "live": self.live,
+            "waiters": self.waiters,
+            "peak_waiters": self.peak_waiters,
+            "orders": len(self._by_order),
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
+
+
+order_waiters = OrderWaiters(settings.order_waiter_queue_size)
@@ -0,0 +1,61 @@
+"""Run from services/api-gateway: PYTHONPATH=src python -m pytest tests"""
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from gateway.cache import order_cache
+from gateway.main import app
+from gateway.upstream import orders_upstream
+
+ORDER_ID = "11111111-1111-1111-1111-111111111111"
+HEADERS = {"X-User-Id": "1"}
+
+
+async def _until(condition) -> None:
+    async def poll() -> None:
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), 2.0)
+
+
+def test_read_started_before_invalidation_is_not_joined_or_cached(monkeypatch):
+    async def scenario() -> None:
+        bodies = iter([b"OLD", b"NEW"])
+        release_old = asyncio.Event()
+        calls = 0
+
+        async def send(method, path, headers, content=None, params=None, stream=False, timeout=None):
+            nonlocal calls
+            calls += 1
+            body = next(bodies)
+            if body == b"OLD":
+                await release_old.wait()
+            return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+
+        monkeypatch.setattr(orders_upstream, "send", send)
+        monkeypatch.setattr(order_cache, "live", True)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gw") as client:
+            first = asyncio.create_task(client.get(f"/orders/{ORDER_ID}", headers=HEADERS))
+            await _until(lambda: calls == 1)
+            # The order changes while the first read is in flight.
+            order_cache.invalidate(("order", ORDER_ID))
+            second = asyncio.create_task(client.get(f"/orders/{ORDER_ID}", headers=HEADERS))
+            # A second upstream read: the request did not join the one predating the change.
+            await _until(lambda: calls == 2)
+            release_old.set()
+            first_resp, second_resp = await asyncio.gather(first, second)
+            third_resp = await client.get(f"/orders/{ORDER_ID}", headers=HEADERS)
+
+        assert first_resp.content == b"OLD"
+        assert second_resp.content == b"NEW"
+        assert third_resp.content == b"NEW"
+        assert calls == 2
+
+    order_cache.clear()
+    try:
+        asyncio.run(scenario())
+    finally:
+        order_cache.clear()
@@ -5,6 +5,14 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=None, extra="ignore")
 
     gateway_url: str = "http://gateway:8000"
+    # Order status sockets share a few multiplexed connections to the gateway.
+    ws_mux_connections: int = 2
+    ws_mux_reconnect_sec: float = 1.0
+    # A client socket that cannot take an event within this time is closed.
+    ws_send_timeout_sec: float = 5.0
+    # Events queued per client socket; when full, "drop" the oldest or "disconnect" the client.
+    ws_send_queue_size: int = 64
+    ws_slow_consumer_policy: str = "drop"
 
 
 settings = Settings()
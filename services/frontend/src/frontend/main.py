@@ -1,18 +1,38 @@
 from __future__ import annotations
 
-import asyncio
+from contextlib import asynccontextmanager
 from typing import Any, Dict
+from uuid import UUID
 
 import httpx
-import websockets
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 from frontend.config import settings
+from frontend.mux import OrderStatusMux, user_key
+
+order_mux = OrderStatusMux(
+    f"{settings.gateway_url.replace('http://', 'ws://').replace('https://', 'wss://')}/ws/mux",
+    settings.ws_mux_connections,
+    settings.ws_mux_reconnect_sec,
+    settings.ws_send_timeout_sec,
+    settings.ws_send_queue_size,
+    settings.ws_slow_consumer_policy,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    order_mux.start()
+    try:
+        yield
+    finally:
+        await order_mux.close()
 
-app = FastAPI(title="Frontend", version="1.0.0")
+
+app = FastAPI(title="Frontend", version="1.0.0", lifespan=lifespan)
 
 templates = Environment(
     loader=FileSystemLoader("src/frontend/templates"),
@@ -29,10 +49,16 @@ async def index(request: Request):
     return HTMLResponse(html)
 
 
-async def _proxy(method: str, path: str, headers: Dict[str, str] | None = None, json_body: Any | None = None):
+async def _proxy(
+    method: str,
+    path: str,
+    headers: Dict[str, str] | None = None,
+    json_body: Any | None = None,
+    params: Dict[str, Any] | None = None,
+):
     url = f"{settings.gateway_url}{path}"
     async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.request(method, url, headers=headers, json=json_body)
+        resp = await client.request(method, url, headers=headers, json=json_body, params=params)
     return resp
 
 
@@ -65,8 +91,9 @@ async def api_create_order(payload: dict):
 
 
 @app.get("/api/orders")
-async def api_list_orders(user_id: int):
-    resp = await _proxy("GET", "/orders", headers=_user_headers(int(user_id)))
+async def api_list_orders(user_id: int, limit: int | None = None, cursor: str | None = None, status: str | None = None):
+    params = {k: v for k, v in {"limit": limit, "cursor": cursor, "status": status}.items() if v is not None}
+    resp = await _proxy("GET", "/orders", headers=_user_headers(int(user_id)), params=params)
     return JSONResponse(status_code=resp.status_code, content=resp.json())
 
 
@@ -76,29 +103,36 @@ async def api_balance(user_id: int):
     return JSONResponse(status_code=resp.status_code, content=resp.json())
 
 
+@app.get("/internal/ws")
+async def get_ws_stats():
+    return order_mux.snapshot()
+
+
+async def _serve_key(websocket: WebSocket, key: str) -> None:
+    order_mux.clients += 1
+    await order_mux.subscribe(key, websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except Exception:
+        pass
+    finally:
+        order_mux.clients -= 1
+        await order_mux.unsubscribe(key, websocket)
+
+
+@app.websocket("/ws/orders")
+async def ws_user_proxy(websocket: WebSocket, user_id: int):
+    await websocket.accept()
+    await _serve_key(websocket, user_key(user_id))
+
+
 @app.websocket("/ws/orders/{order_id}")
 async def ws_proxy(websocket: WebSocket, order_id: str):
     await websocket.accept()
-    upstream = f"{settings.gateway_url.replace('http://', 'ws://').replace('https://', 'wss://')}/orders/{order_id}/ws"
     try:
-        async with websockets.connect(upstream) as upstream_ws:
-            async def forward_upstream():
-                async for msg in upstream_ws:
-                    await websocket.send_text(msg)
-
-            async def drain_client():
-                while True:
-                    await websocket.receive_text()
-
-            t1 = asyncio.create_task(forward_upstream())
-            t2 = asyncio.create_task(drain_client())
-            done, pending = await asyncio.wait({t1, t2}, return_when=asyncio.FIRST_EXCEPTION)
-            for p in pending:
-                p.cancel()
-    except WebSocketDisconnect:
+        key = str(UUID(order_id))
+    except ValueError:
+        await websocket.close(code=1008)
         return
-    except Exception:
-        try:
-            await websocket.close()
-        except Exception:
-            pass
+    await _serve_key(websocket, key)
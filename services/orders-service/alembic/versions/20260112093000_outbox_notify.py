@@ -0,0 +1,34 @@
+from alembic import op
+
+
+revision = "20260112093000"
+down_revision = "20251224181040"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Statement-level trigger: one NOTIFY per inserting statement, and Postgres
+    # folds duplicates within a transaction, so bulk inserts wake the publisher once.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION outbox_messages_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('outbox_messages', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_outbox_messages_notify
+        AFTER INSERT ON outbox_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION outbox_messages_notify()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_outbox_messages_notify ON outbox_messages")
+    op.execute("DROP FUNCTION IF EXISTS outbox_messages_notify()")
@@ -0,0 +1,49 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20260114101500"
+down_revision = "20260112093000"
+branch_labels = None
+depends_on = None
+
+OUTBOX_PARTITIONS = 64
+
+
+def upgrade() -> None:
+    op.add_column(
+        "outbox_messages",
+        sa.Column("aggregate_key", sa.String(length=128), sa.Computed("payload->>'order_id'", persisted=True)),
+    )
+    op.add_column(
+        "outbox_messages",
+        sa.Column(
+            "partition",
+            sa.Integer(),
+            sa.Computed(
+                f"(hashtext(coalesce(payload->>'order_id', id::text)) & 2147483647) % {OUTBOX_PARTITIONS}",
+                persisted=True,
+            ),
+        ),
+    )
+
+    op.create_table(
+        "outbox_partitions",
+        sa.Column("partition", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("owner", sa.String(length=128), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute(f"INSERT INTO outbox_partitions (partition) SELECT generate_series(0, {OUTBOX_PARTITIONS - 1})")
+
+    op.create_table(
+        "outbox_workers",
+        sa.Column("worker_id", sa.String(length=128), primary_key=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("outbox_workers")
+    op.drop_table("outbox_partitions")
+    op.drop_column("outbox_messages", "partition")
+    op.drop_column("outbox_messages", "aggregate_key")
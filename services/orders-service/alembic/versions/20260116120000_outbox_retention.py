@@ -0,0 +1,48 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "20260116120000"
+down_revision = "20260114101500"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The full index on published_at covered every row ever written; the publisher
+    # only needs pending rows and retention only needs published ones.
+    op.drop_index("ix_outbox_published_at", table_name="outbox_messages")
+    op.create_index(
+        "ix_outbox_pending",
+        "outbox_messages",
+        ["partition", "created_at", "id"],
+        postgresql_where=sa.text("published_at IS NULL"),
+    )
+    op.create_index(
+        "ix_outbox_published_at",
+        "outbox_messages",
+        ["published_at"],
+        postgresql_where=sa.text("published_at IS NOT NULL"),
+    )
+
+    op.create_table(
+        "outbox_messages_archive",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("exchange", sa.String(length=128), nullable=False),
+        sa.Column("routing_key", sa.String(length=128), nullable=False),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("published_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_outbox_messages_archive_archived_at", "outbox_messages_archive", ["archived_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_messages_archive_archived_at", table_name="outbox_messages_archive")
+    op.drop_table("outbox_messages_archive")
+    op.drop_index("ix_outbox_published_at", table_name="outbox_messages")
+    op.drop_index("ix_outbox_pending", table_name="outbox_messages")
+    op.create_index("ix_outbox_published_at", "outbox_messages", ["published_at"])
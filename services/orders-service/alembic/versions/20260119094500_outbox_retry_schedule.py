@@ -0,0 +1,40 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20260119094500"
+down_revision = "20260116120000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("outbox_messages", sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("outbox_messages", sa.Column("parked_at", sa.DateTime(timezone=True), nullable=True))
+
+    op.drop_index("ix_outbox_pending", table_name="outbox_messages")
+    op.create_index(
+        "ix_outbox_pending",
+        "outbox_messages",
+        ["partition", "created_at", "id"],
+        postgresql_where=sa.text("published_at IS NULL AND parked_at IS NULL"),
+    )
+    op.create_index(
+        "ix_outbox_pending_aggregate_key",
+        "outbox_messages",
+        ["aggregate_key"],
+        postgresql_where=sa.text("published_at IS NULL AND parked_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_pending_aggregate_key", table_name="outbox_messages")
+    op.drop_index("ix_outbox_pending", table_name="outbox_messages")
+    op.create_index(
+        "ix_outbox_pending",
+        "outbox_messages",
+        ["partition", "created_at", "id"],
+        postgresql_where=sa.text("published_at IS NULL"),
+    )
+    op.drop_column("outbox_messages", "parked_at")
+    op.drop_column("outbox_messages", "next_attempt_at")
@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "20260121110000"
+down_revision = "20260119094500"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The inbox only needs the message id for dedup; payloads are optional now.
+    op.alter_column("inbox_messages", "payload", existing_type=postgresql.JSONB(astext_type=sa.Text()), nullable=True)
+    op.create_index("ix_inbox_messages_received_at", "inbox_messages", ["received_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inbox_messages_received_at", table_name="inbox_messages")
+    op.execute("UPDATE inbox_messages SET payload = '{}'::jsonb WHERE payload IS NULL")
+    op.alter_column("inbox_messages", "payload", existing_type=postgresql.JSONB(astext_type=sa.Text()), nullable=False)
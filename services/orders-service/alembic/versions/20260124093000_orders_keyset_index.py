@@ -0,0 +1,25 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20260124093000"
+down_revision = "20260121110000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keyset pages of a user's orders, newest first; status is carried in the
+    # index for filtering. The plain user_id index is a prefix of it.
+    op.create_index(
+        "ix_orders_user_created",
+        "orders",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        postgresql_include=["status"],
+    )
+    op.drop_index("ix_orders_user_id", table_name="orders")
+
+
+def downgrade() -> None:
+    op.create_index("ix_orders_user_id", "orders", ["user_id"])
+    op.drop_index("ix_orders_user_created", table_name="orders")
@@ -0,0 +1,18 @@
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20260126100000"
+down_revision = "20260124093000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE SEQUENCE IF NOT EXISTS order_status_event_seq")
+    op.add_column("orders", sa.Column("status_seq", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("orders", "status_seq")
+    op.execute("DROP SEQUENCE IF EXISTS order_status_event_seq")
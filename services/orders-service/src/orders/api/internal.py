@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import text
+
+from orders.api.routes import manager
+from orders.db.session import SessionLocal
+from orders.dedup import inbox_dedup
+from orders.messaging.status_routing import status_bindings
+from orders.metrics import inbox_stats, outbox_stats, retention_stats
+from orders.outbox import list_parked, outbox_partition_status, requeue_parked
+from orders.replay import replay_buffer
+from orders.status_cache import status_cache
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+
+@router.get("/outbox/stats")
+async def get_outbox_stats():
+    return outbox_stats.snapshot()
+
+
+@router.get("/outbox/partitions")
+async def get_outbox_partitions():
+    return await outbox_partition_status(SessionLocal)
+
+
+@router.get("/retention/stats")
+async def get_retention_stats():
+    return retention_stats.snapshot()
+
+
+@router.get("/outbox/parked")
+async def get_parked_outbox(limit: int = Query(default=100, ge=1, le=1000)):
+    return await list_parked(SessionLocal, limit)
+
+
+@router.post("/outbox/parked/{message_id}/requeue")
+async def requeue_parked_outbox(message_id: UUID):
+    if not await requeue_parked(SessionLocal, message_id):
+        raise HTTPException(status_code=404, detail="Parked message not found")
+    return {"id": str(message_id), "requeued": True}
+
+
+@router.get("/inbox/stats")
+async def get_inbox_stats():
+    async with SessionLocal() as session:
+        row = (
+            await session.execute(
+                text(
+                    "SELECT pg_total_relation_size('inbox_messages') AS total_bytes,"
+                    " pg_indexes_size('inbox_messages') AS index_bytes,"
+                    " (SELECT reltuples::bigint FROM pg_class WHERE relname = 'inbox_messages') AS approx_rows"
+                )
+            )
+        ).one()
+    return {
+        **inbox_stats.snapshot(),
+        "cache_size": len(inbox_dedup),
+        "table": {"total_bytes": row.total_bytes, "index_bytes": row.index_bytes, "approx_rows": row.approx_rows},
+    }
+
+
+@router.get("/ws/stats")
+async def get_ws_stats():
+    return {
+        **manager.snapshot(),
+        "routing": status_bindings.snapshot(),
+        "status_cache": status_cache.snapshot(),
+        "replay": replay_buffer.snapshot(),
+    }
@@ -1,59 +1,193 @@
 from __future__ import annotations
 
+import base64
 import json
+import time
 from datetime import datetime, timezone
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_
 from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.background import BackgroundTask
 
 from orders.api.deps import get_user_id
 from orders.config import settings
 from orders.db.session import SessionLocal
+from orders.messaging.status_routing import status_bindings
 from orders.models.order import Order, OrderStatus
 from orders.models.outbox import OutboxMessage
-from orders.schemas import OrderCreate, OrderRead
-from orders.websocket_manager import ConnectionManager
+from orders.outbox import outbox_fast_path
+from orders.replay import replay_buffer
+from orders.schemas import OrderBatchCreate, OrderBatchItemResult, OrderBatchResult, OrderCreate, OrderPage, OrderRead
+from orders.status_cache import status_cache
+from orders.websocket_manager import ConnectionManager, StatusSink
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 ws_router = APIRouter(tags=["ws"])
 
-manager = ConnectionManager()
+manager = ConnectionManager(
+    settings.ws_send_queue_size,
+    settings.ws_slow_consumer_policy,
+    settings.ws_send_timeout_sec,
+    on_watch=status_bindings.watch,
+    on_unwatch=status_bindings.unwatch,
+)
+status_bindings.on_unbound.append(status_cache.forget)
+status_bindings.on_unbound.append(replay_buffer.forget)
+
+_ORDER_COLUMNS = (Order.id, Order.user_id, Order.amount, Order.description, Order.status, Order.created_at, Order.updated_at)
+
+
+async def _create_orders(session, user_id: int, items: list[OrderCreate]) -> list:
+    """Inserts orders and their payment.request outbox rows: one multi-row INSERT each."""
+    now = datetime.now(timezone.utc).isoformat()
+    ids = [uuid4() for _ in items]
+    returned = (
+        await session.execute(
+            insert(Order)
+            .values(
+                [
+                    {"id": order_id, "user_id": user_id, "amount": item.amount, "description": item.description, "status": OrderStatus.NEW}
+                    for order_id, item in zip(ids, items)
+                ]
+            )
+            .returning(*_ORDER_COLUMNS)
+        )
+    ).all()
+    by_id = {row.id: row for row in returned}
+    outbox_ids = [uuid4() for _ in items]
+    await session.execute(
+        insert(OutboxMessage).values(
+            [
+                {
+                    "id": outbox_id,
+                    "exchange": settings.exchange_events,
+                    "routing_key": "payment.request",
+                    "payload": {
+                        "event_id": str(uuid4()),
+                        "type": "payment.request",
+                        "order_id": str(order_id),
+                        "user_id": user_id,
+                        "amount": item.amount,
+                        "created_at": now,
+                    },
+                    "attempts": 0,
+                }
+                for outbox_id, order_id, item in zip(outbox_ids, ids, items)
+            ]
+        )
+    )
+    outbox_fast_path.track(session, outbox_ids)
+    return [by_id[order_id] for order_id in ids]
 
 
 @router.post("", response_model=OrderRead)
 async def create_order(payload: OrderCreate, user_id: int = Depends(get_user_id)):
     async with SessionLocal() as session:
         async with session.begin():
-            order = Order(user_id=user_id, amount=payload.amount, description=payload.description, status=OrderStatus.NEW)
-            session.add(order)
-            await session.flush()
-
-            evt = {
-                "event_id": str(uuid4()),
-                "type": "payment.request",
-                "order_id": str(order.id),
-                "user_id": user_id,
-                "amount": payload.amount,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            }
-            session.add(
-                OutboxMessage(
-                    exchange=settings.exchange_events,
-                    routing_key="payment.request",
-                    payload=evt,
-                )
-            )
-        await session.refresh(order)
-        return order
+            (order,) = await _create_orders(session, user_id, [payload])
+        return OrderRead.model_validate(order)
 
 
-@router.get("", response_model=list[OrderRead])
-async def list_orders(user_id: int = Depends(get_user_id)):
+@router.post("/batch", response_model=OrderBatchResult)
+async def create_orders_batch(payload: OrderBatchCreate, user_id: int = Depends(get_user_id)):
+    results: list[OrderBatchItemResult] = []
+    valid: list[tuple[int, OrderCreate]] = []
+    for index, raw in enumerate(payload.orders):
+        try:
+            valid.append((index, OrderCreate.model_validate(raw)))
+        except ValidationError as exc:
+            results.append(OrderBatchItemResult(index=index, error=str(exc.errors()[0]["msg"])))
+
+    if valid:
+        async with SessionLocal() as session:
+            async with session.begin():
+                rows = await _create_orders(session, user_id, [item for _, item in valid])
+        results += [
+            OrderBatchItemResult(index=index, order=OrderRead.model_validate(row)) for (index, _), row in zip(valid, rows)
+        ]
+    results.sort(key=lambda r: r.index)
+    return OrderBatchResult(created=len(valid), results=results)
+
+
+def _encode_cursor(order: Order) -> str:
+    raw = json.dumps([order.created_at.isoformat(), str(order.id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, order_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(order_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("", response_model=OrderPage)
+async def list_orders(
+    user_id: int = Depends(get_user_id),
+    limit: int = Query(default=settings.orders_page_size_default, ge=1, le=settings.orders_page_size_max),
+    cursor: str | None = None,
+    status: OrderStatus | None = None,
+):
+    # Keyset pagination over ix_orders_user_created: each page is an index range
+    # scan, newest first, however deep the client has paged.
+    stmt = select(Order).where(Order.user_id == user_id)
+    if status is not None:
+        stmt = stmt.where(Order.status == status)
+    if cursor:
+        created_at, order_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(Order.created_at, Order.id) < tuple_(created_at, order_id))
+    stmt = stmt.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
     async with SessionLocal() as session:
-        result = await session.execute(select(Order).where(Order.user_id == user_id).order_by(Order.created_at.desc()))
-        return list(result.scalars().all())
+        orders = list((await session.execute(stmt)).scalars().all())
+    next_cursor = _encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return OrderPage(items=orders[:limit], next_cursor=next_cursor)
+
+
+@router.get("/export")
+async def export_orders(
+    user_id: int = Depends(get_user_id),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    status: OrderStatus | None = None,
+):
+    """The user's full order history, oldest first, as NDJSON streamed from a server-side cursor."""
+    stmt = select(*_ORDER_COLUMNS).where(Order.user_id == user_id)
+    if since is not None:
+        stmt = stmt.where(Order.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(Order.created_at < until)
+    if status is not None:
+        stmt = stmt.where(Order.status == status)
+    stmt = stmt.order_by(Order.created_at, Order.id).execution_options(yield_per=settings.orders_export_chunk_size)
+
+    async def rows():
+        async with SessionLocal() as session:
+            result = await session.stream(stmt)
+            async for chunk in result.partitions():
+                yield "".join(
+                    json.dumps(
+                        {
+                            "id": str(row.id),
+                            "user_id": row.user_id,
+                            "amount": row.amount,
+                            "description": row.description,
+                            "status": row.status.value,
+                            "created_at": row.created_at.isoformat(),
+                            "updated_at": row.updated_at.isoformat(),
+                        },
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                    for row in chunk
+                )
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 
 @router.get("/{order_id}", response_model=OrderRead)
@@ -65,27 +199,240 @@ async def get_order(order_id: UUID, user_id: int = Depends(get_user_id)):
         return order
 
 
-@ws_router.websocket("/ws/orders/{order_id}")
-async def ws_order(websocket: WebSocket, order_id: UUID):
-    await manager.connect(order_id, websocket)
+def _status_message(order_id: UUID, user_id: int, status: OrderStatus, updated_at: datetime, seq: int | None) -> str:
+    return json.dumps({
+        "seq": seq,
+        "type": "order.status",
+        "order_id": str(order_id),
+        "user_id": user_id,
+        "status": status.value,
+        "updated_at": updated_at.isoformat(),
+    }, ensure_ascii=False)
+
+
+async def _status_snapshot(order_id: UUID) -> str | None:
+    cached = status_cache.get(order_id)
+    if cached is not None:
+        return cached
+    async with SessionLocal() as session:
+        row = (
+            await session.execute(
+                select(Order.user_id, Order.status, Order.updated_at, Order.status_seq).where(Order.id == order_id)
+            )
+        ).one_or_none()
+    if row is None:
+        return None
+    message = _status_message(order_id, row.user_id, row.status, row.updated_at, row.status_seq)
+    status_cache.put(order_id, row.user_id, row.status.value, message)
+    return message
+
+
+async def _open_orders_snapshot(user_id: int) -> list[str]:
+    """Current status of the user's open orders, newest first (capped at ORDERS_PAGE_SIZE_MAX)."""
+    async with SessionLocal() as session:
+        rows = (
+            await session.execute(
+                select(Order.id, Order.status, Order.updated_at, Order.status_seq)
+                .where(Order.user_id == user_id, Order.status == OrderStatus.NEW)
+                .order_by(Order.created_at.desc(), Order.id.desc())
+                .limit(settings.orders_page_size_max)
+            )
+        ).all()
+    snapshots = []
+    for row in rows:
+        message = _status_message(row.id, user_id, row.status, row.updated_at, row.status_seq)
+        status_cache.put(row.id, user_id, row.status.value, message)
+        snapshots.append(message)
+    return snapshots
+
+
+def _queue_replay(websocket: WebSocket | StatusSink, kind: str, key, last_event_id: int | None) -> bool:
+    """Queues the events missed since `last_event_id`; False if the ring cannot vouch for them.
+
+    Called right before subscribing, which indexes the socket before its first await:
+    every event is then queued once, from the ring or from a broadcast, in order.
+    """
+    replay = replay_buffer.since(kind, key, last_event_id) if last_event_id is not None else None
+    if replay is None:
+        return False
+    manager.register(websocket)
+    for message in replay:
+        manager.send(websocket, message)
+    return True
+
+
+async def _watch_order(websocket: WebSocket | StatusSink, order_id: UUID, last_event_id: int | None) -> None:
+    replayed = _queue_replay(websocket, "order", order_id, last_event_id)
+    await manager.subscribe(order_id, websocket)
+    if not replayed:
+        snapshot = await _status_snapshot(order_id)
+        if snapshot:
+            manager.send(websocket, snapshot)
+
+
+async def _watch_user(websocket: WebSocket, user_id: int, last_event_id: int | None) -> None:
+    replayed = _queue_replay(websocket, "user", user_id, last_event_id)
+    await manager.subscribe_user(user_id, websocket)
+    if not replayed:
+        for snapshot in await _open_orders_snapshot(user_id):
+            manager.send(websocket, snapshot)
+
+
+_FINAL_STATUSES = (OrderStatus.FINISHED.value, OrderStatus.CANCELLED.value)
+
+
+async def _owned_status(order_id: UUID, user_id: int) -> tuple[str, dict]:
+    snapshot = await _status_snapshot(order_id)
+    event = json.loads(snapshot) if snapshot else None
+    if event is None or event["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return snapshot, event
+
+
+@router.get("/{order_id}/wait")
+async def wait_order_status(
+    order_id: UUID,
+    timeout: float = Query(default=settings.orders_wait_default_sec, ge=0, le=settings.orders_wait_max_sec),
+    user_id: int = Depends(get_user_id),
+):
+    """Long-poll: the order.status event that makes the order final, or its current status after `timeout` seconds."""
+    sink = StatusSink()
+    try:
+        # Only the owner's open orders get a subscription (and a routing key bound).
+        message, event = await _owned_status(order_id, user_id)
+        if timeout > 0 and event["status"] not in _FINAL_STATUSES:
+            await manager.subscribe(order_id, sink)
+            # Read again: a change before the subscription is not missed.
+            message, event = await _owned_status(order_id, user_id)
+        deadline = time.monotonic() + timeout
+        while event["status"] not in _FINAL_STATUSES:
+            received = await sink.next(deadline - time.monotonic())
+            if received is None:
+                break
+            message, event = received, json.loads(received)
+    finally:
+        await manager.remove(sink)
+    return Response(content=message, media_type="application/json")
+
+
+@router.get("/{order_id}/events")
+async def order_status_events(
+    order_id: UUID,
+    last_event_id: int | None = Query(default=None),
+    last_event_id_header: int | None = Header(default=None, alias="Last-Event-ID"),
+    user_id: int = Depends(get_user_id),
+):
+    """Server-Sent Events: the current status (or the events missed since Last-Event-ID), then every change until final."""
+    await _owned_status(order_id, user_id)
+    sink = StatusSink()
+    manager.register(sink)
+    try:
+        await _watch_order(sink, order_id, last_event_id if last_event_id is not None else last_event_id_header)
+    except BaseException:
+        await manager.remove(sink)
+        raise
+
+    async def events():
+        try:
+            while True:
+                message = await sink.next(settings.orders_sse_keepalive_sec)
+                if message is None:
+                    if sink.closed:
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                event = json.loads(message)
+                if event.get("seq") is not None:
+                    yield f"id: {event['seq']}\n"
+                yield f"event: order.status\ndata: {message}\n\n"
+                if event["status"] in _FINAL_STATUSES:
+                    return
+        finally:
+            await manager.remove(sink)
+
+    # The generator's finally never runs if the client leaves before the first chunk.
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+        background=BackgroundTask(manager.remove, sink),
+    )
+
+
+async def _serve(websocket: WebSocket) -> None:
     try:
-        async with SessionLocal() as session:
-            order = (await session.execute(select(Order).where(Order.id == order_id))).scalar_one_or_none()
-            if order:
-                await websocket.send_text(json.dumps({
-                    "type": "order.status",
-                    "order_id": str(order.id),
-                    "user_id": order.user_id,
-                    "status": order.status.value,
-                    "updated_at": order.updated_at.isoformat(),
-                }, ensure_ascii=False))
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        await manager.disconnect(order_id, websocket)
+        pass
+    except Exception:
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+    finally:
+        await manager.remove(websocket)
+
+
+@ws_router.websocket("/ws/orders")
+async def ws_user_orders(websocket: WebSocket, user_id: int, last_event_id: int | None = None):
+    """Status events of all the user's orders: open orders' current status first, then every change.
+
+    With `last_event_id` (the `seq` of the last event received) the missed events are
+    replayed instead, if this replica still has all of them.
+    """
+    await websocket.accept()
+    await _watch_user(websocket, user_id, last_event_id)
+    await _serve(websocket)
+
+
+@ws_router.websocket("/ws/orders/{order_id}")
+async def ws_order(websocket: WebSocket, order_id: UUID, last_event_id: int | None = None):
+    await websocket.accept()
+    await _watch_order(websocket, order_id, last_event_id)
+    await _serve(websocket)
+
+
+@ws_router.websocket("/ws/mux")
+async def ws_mux(websocket: WebSocket):
+    """One socket, many subscriptions.
+
+    In: {"op": "subscribe"|"unsubscribe", "order_id" | "user_id": ..., "last_event_id": seq (optional)}.
+    Out: order.status events of everything subscribed.
+    """
+    await websocket.accept()
+    manager.register(websocket)
+    orders: set[UUID] = set()
+    users: set[int] = set()
+    try:
+        while True:
+            try:
+                msg = json.loads(await websocket.receive_text())
+                op = msg["op"]
+                order_id = UUID(msg["order_id"]) if "order_id" in msg else None
+                user_id = int(msg["user_id"]) if order_id is None else None
+                last_event_id = int(msg["last_event_id"]) if msg.get("last_event_id") is not None else None
+            except (ValueError, KeyError, TypeError):
+                continue
+            if order_id is not None:
+                if op == "subscribe" and order_id not in orders:
+                    orders.add(order_id)
+                    await _watch_order(websocket, order_id, last_event_id)
+                elif op == "unsubscribe" and order_id in orders:
+                    orders.discard(order_id)
+                    await manager.disconnect(order_id, websocket)
+            elif op == "subscribe" and user_id not in users:
+                users.add(user_id)
+                await _watch_user(websocket, user_id, last_event_id)
+            elif op == "unsubscribe" and user_id in users:
+                users.discard(user_id)
+                await manager.disconnect_user(user_id, websocket)
+    except WebSocketDisconnect:
+        pass
     except Exception:
-        await manager.disconnect(order_id, websocket)
         try:
             await websocket.close()
         except Exception:
             pass
+    finally:
+        await manager.remove(websocket)
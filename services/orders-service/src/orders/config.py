@@ -8,10 +8,69 @@ class Settings(BaseSettings):
     rabbitmq_url: str
 
     exchange_events: str = "gozon.events"
-    exchange_ws: str = "gozon.ws"
+    # Topic exchange; the name changed when it stopped being fanout, since a durable
+    # exchange cannot be redeclared with another type.
+    exchange_ws: str = "gozon.ws.topic"
 
     outbox_poll_interval_sec: float = 1.0
+    # LISTEN/NOTIFY wakeup; the poll then only runs as a safety net.
+    outbox_notify_enabled: bool = True
+    outbox_safety_poll_interval_sec: float = 10.0
+    outbox_listener_keepalive_sec: float = 30.0
+    # Batch size adapts between min and max to the backlog; concurrency=1 publishes sequentially.
+    outbox_batch_size_min: int = 10
+    outbox_batch_size_max: int = 500
+    outbox_publish_concurrency: int = 100
+    # Publisher workers per process; outbox partitions are leased across all workers of all replicas.
+    outbox_workers_per_process: int = 4
+    outbox_lease_ttl_sec: float = 15.0
+    outbox_lease_renew_sec: float = 5.0
+    # Failed publishes back off exponentially; after max attempts the row is parked.
+    outbox_retry_base_sec: float = 1.0
+    outbox_retry_max_sec: float = 300.0
+    outbox_max_attempts: int = 10
+    # Publish outbox rows right after their transaction commits; the poller sweeps the rest.
+    outbox_fast_path_enabled: bool = False
+    outbox_fast_path_max_pending: int = 10_000
+    # Published outbox rows are pruned (or moved to outbox_messages_archive) after the TTL.
+    outbox_retention_enabled: bool = True
+    outbox_published_ttl_sec: float = 86400.0
+    outbox_archive_enabled: bool = False
+    outbox_archive_ttl_sec: float = 30 * 86400.0
+    # Inbox rows only guard against redelivery; keep them longer than any redelivery can take.
+    inbox_retention_sec: float = 7 * 86400.0
+    inbox_store_payload: bool = False
+    inbox_dedup_cache_size: int = 100_000
+    retention_interval_sec: float = 60.0
+    retention_batch_size: int = 1000
     consumer_prefetch: int = 10
+    # GET /orders is keyset-paginated.
+    orders_page_size_default: int = 50
+    orders_page_size_max: int = 500
+    orders_batch_max_size: int = 1000
+    # Rows fetched per round trip by the NDJSON export cursor.
+    orders_export_chunk_size: int = 1000
+    # Per-socket send queue; when it is full, "drop" discards the oldest message, "disconnect" closes the socket.
+    ws_send_queue_size: int = 64
+    ws_slow_consumer_policy: str = "drop"
+    ws_send_timeout_sec: float = 5.0
+    # order.status events are routed by order.status.<user_id % WS_USER_SHARDS>.<order_id>;
+    # each replica binds only the orders its sockets watch.
+    ws_selective_routing: bool = True
+    ws_user_shards: int = 256
+    ws_bind_timeout_sec: float = 5.0
+    # Bindings outlive their last subscriber by this long, so reconnecting clients find them.
+    ws_unbind_delay_sec: float = 30.0
+    # Latest status per order served as the WebSocket snapshot; 0 disables.
+    order_status_cache_size: int = 100_000
+    # Recent events kept per order and per user for clients resuming with last_event_id.
+    ws_replay_order_events: int = 8
+    ws_replay_user_events: int = 64
+    ws_replay_max_rings: int = 100_000
+    # GET /orders/{id}/wait (long-poll) and /orders/{id}/events (SSE).
+    orders_wait_default_sec: float = 30.0
+    orders_wait_max_sec: float = 120.0
+    orders_sse_keepalive_sec: float = 15.0
 
 
 settings = Settings()
@@ -2,21 +2,27 @@ from __future__ import annotations
 
 import asyncio
 import json
-from datetime import datetime, timezone
-from uuid import UUID
+import time
+from uuid import UUID, uuid4
 
 from aio_pika.abc import AbstractIncomingMessage
-from sqlalchemy import insert, select
+from sqlalchemy import insert, select, update
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from orders.config import settings
+from orders.dedup import inbox_dedup
+from orders.metrics import inbox_stats
 from orders.models.inbox import InboxMessage
-from orders.models.order import Order, OrderStatus
+from orders.models.order import Order, OrderStatus, order_status_event_seq
 from orders.models.outbox import OutboxMessage
+from orders.outbox import outbox_fast_path
+from orders.replay import replay_buffer
 from orders.schemas import PaymentResultEvent
+from orders.status_cache import status_cache
 from orders.websocket_manager import ConnectionManager
 from orders.messaging.rabbit import Rabbit
+from orders.messaging.status_routing import parse_routing_key, status_bindings, status_routing_key
 
 
 async def payment_result_consumer(session_factory: async_sessionmaker, rabbit: Rabbit, stop_event: asyncio.Event) -> None:
@@ -36,40 +42,58 @@ async def _handle_payment_result(message: AbstractIncomingMessage, session_facto
         evt = PaymentResultEvent(**payload)
 
         msg_id = message.message_id or evt.event_id
+        if msg_id in inbox_dedup:
+            inbox_stats.cache_hits += 1
+            return
 
         async with session_factory() as session:
             async with session.begin():
-                stmt = pg_insert(InboxMessage).values(message_id=msg_id, payload=payload).on_conflict_do_nothing(
-                    index_elements=["message_id"]
-                ).returning(InboxMessage.message_id)
+                started = time.perf_counter()
+                stmt = pg_insert(InboxMessage).values(
+                    message_id=msg_id, payload=payload if settings.inbox_store_payload else None
+                ).on_conflict_do_nothing(index_elements=["message_id"]).returning(InboxMessage.message_id)
                 inserted = (await session.execute(stmt)).scalar_one_or_none()
+                inbox_stats.insert.observe(time.perf_counter() - started)
                 if inserted is None:
+                    inbox_stats.db_duplicates += 1
+                    inbox_dedup.add(msg_id)
                     return
 
                 order = (await session.execute(select(Order).where(Order.id == evt.order_id))).scalar_one_or_none()
-                if not order:
-                    return
-
-                if order.status in (OrderStatus.FINISHED, OrderStatus.CANCELLED):
-                    return
-
-                order.status = OrderStatus.FINISHED if evt.status == "SUCCEEDED" else OrderStatus.CANCELLED
-
-                ws_payload = {
-                    "event_id": str(UUID(msg_id)) if _is_uuid(msg_id) else msg_id,
-                    "type": "order.status",
-                    "order_id": str(order.id),
-                    "user_id": order.user_id,
-                    "status": order.status.value,
-                    "updated_at": datetime.now(timezone.utc).isoformat(),
-                }
-                session.add(
-                    OutboxMessage(
-                        exchange=settings.exchange_ws,
-                        routing_key="order.status",
-                        payload=ws_payload,
+                if order and order.status not in (OrderStatus.FINISHED, OrderStatus.CANCELLED):
+                    status = OrderStatus.FINISHED if evt.status == "SUCCEEDED" else OrderStatus.CANCELLED
+                    changed = (
+                        await session.execute(
+                            update(Order)
+                            .where(Order.id == order.id)
+                            .values(status=status, status_seq=order_status_event_seq.next_value())
+                            .returning(Order.status_seq, Order.updated_at)
+                            .execution_options(synchronize_session=False)
+                        )
+                    ).one()
+
+                    ws_payload = {
+                        "event_id": str(UUID(msg_id)) if _is_uuid(msg_id) else msg_id,
+                        "seq": changed.status_seq,
+                        "type": "order.status",
+                        "order_id": str(order.id),
+                        "user_id": order.user_id,
+                        "status": status.value,
+                        "updated_at": changed.updated_at.isoformat(),
+                    }
+                    outbox_id = uuid4()
+                    session.add(
+                        OutboxMessage(
+                            id=outbox_id,
+                            exchange=settings.exchange_ws,
+                            routing_key=status_routing_key(order.user_id, order.id),
+                            payload=ws_payload,
+                        )
                     )
-                )
+                    outbox_fast_path.track(session, [outbox_id])
+        # Only remember the id once the inbox row is committed.
+        inbox_stats.inserted += 1
+        inbox_dedup.add(msg_id)
 
 
 def _is_uuid(val: str) -> bool:
@@ -84,16 +108,34 @@ async def ws_broadcast_consumer(rabbit: Rabbit, manager: ConnectionManager, stop
     assert rabbit.channel is not None
     queue = await rabbit.channel.declare_queue("", exclusive=True, auto_delete=True)
     assert rabbit.exchange_ws is not None
-    await queue.bind(rabbit.exchange_ws, routing_key="order.status")
+    await status_bindings.attach(queue, rabbit.exchange_ws)
+    # Events published while the connection was down are lost for this exclusive queue.
+    assert rabbit.connection is not None
+    rabbit.connection.reconnect_callbacks.add(lambda *_: status_cache.clear_open())
+    rabbit.connection.reconnect_callbacks.add(lambda *_: replay_buffer.clear())
 
-    async with queue.iterator() as qiter:
-        async for message in qiter:
-            if stop_event.is_set():
-                break
-            async with message.process(requeue=False):
-                try:
-                    payload = json.loads(message.body.decode("utf-8"))
-                    order_id = UUID(payload["order_id"])
-                    await manager.broadcast(order_id, json.dumps(payload, ensure_ascii=False))
-                except Exception:
-                    continue
+    try:
+        async with queue.iterator() as qiter:
+            async for message in qiter:
+                if stop_event.is_set():
+                    break
+                async with message.process(requeue=False):
+                    try:
+                        # Forward the body as published. Without the status cache, the replay
+                        # buffer and user watchers in its shard, the routing key says all that is needed.
+                        raw = message.body.decode("utf-8")
+                        routed = parse_routing_key(message.routing_key)
+                        if routed is not None and not (
+                            status_cache.max_entries or replay_buffer.max_rings or manager.watches_shard(routed[0])
+                        ):
+                            order_id, user_id = routed[1], None
+                        else:
+                            payload = json.loads(raw)
+                            order_id, user_id = UUID(payload["order_id"]), int(payload["user_id"])
+                            status_cache.put(order_id, user_id, payload["status"], raw, from_event=True)
+                            replay_buffer.record(order_id, user_id, payload.get("seq"), raw)
+                        await manager.broadcast(order_id, raw, user_id)
+                    except Exception:
+                        continue
+    finally:
+        await status_bindings.detach()
@@ -5,11 +5,14 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from orders.api.internal import router as internal_router
 from orders.api.routes import router as orders_router, ws_router, manager
+from orders.config import settings
 from orders.consumers import payment_result_consumer, ws_broadcast_consumer
 from orders.db.session import SessionLocal
 from orders.messaging.rabbit import Rabbit
-from orders.outbox import outbox_publisher_loop
+from orders.outbox import OutboxListener, outbox_fast_path, outbox_publisher_loop, outbox_worker_id
+from orders.retention import retention_loop
 
 rabbit = Rabbit()
 
@@ -17,22 +20,39 @@ rabbit = Rabbit()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await rabbit.connect()
+    if settings.outbox_fast_path_enabled:
+        outbox_fast_path.start(SessionLocal, rabbit)
+
+    listener = OutboxListener(settings.database_url) if settings.outbox_notify_enabled else None
+    if listener:
+        listener.start()
 
     stop = asyncio.Event()
     tasks = [
-        asyncio.create_task(outbox_publisher_loop(SessionLocal, rabbit, stop)),
+        asyncio.create_task(outbox_publisher_loop(SessionLocal, rabbit, stop, listener, outbox_worker_id(i)))
+        for i in range(settings.outbox_workers_per_process)
+    ]
+    tasks += [
         asyncio.create_task(payment_result_consumer(SessionLocal, rabbit, stop)),
         asyncio.create_task(ws_broadcast_consumer(rabbit, manager, stop)),
     ]
+    if settings.outbox_retention_enabled:
+        tasks.append(asyncio.create_task(retention_loop(SessionLocal, stop)))
     try:
         yield
     finally:
         stop.set()
         for t in tasks:
             t.cancel()
+        # Let publisher workers hand their partition leases back.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if listener:
+            await listener.stop()
+        await outbox_fast_path.stop()
         await rabbit.close()
 
 
 app = FastAPI(title="Orders Service", version="1.0.0", lifespan=lifespan)
 app.include_router(orders_router)
 app.include_router(ws_router)
+app.include_router(internal_router)
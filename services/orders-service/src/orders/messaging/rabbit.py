@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List, Sequence
 
 import aio_pika
 from aio_pika import DeliveryMode, ExchangeType, Message, RobustChannel, RobustConnection
@@ -25,7 +26,7 @@ class Rabbit:
             settings.exchange_events, ExchangeType.DIRECT, durable=True
         )
         self.exchange_ws = await self.channel.declare_exchange(
-            settings.exchange_ws, ExchangeType.FANOUT, durable=True
+            settings.exchange_ws, ExchangeType.TOPIC, durable=True
         )
 
         q_requests = await self.channel.declare_queue("payment_requests", durable=True)
@@ -49,3 +50,15 @@ class Rabbit:
             content_type="application/json",
         )
         await ex.publish(msg, routing_key=routing_key)
+
+    async def publish_many(self, items: Sequence[Dict[str, Any]]) -> List[BaseException | None]:
+        """Publishes items (``publish`` kwargs) concurrently; returns None or the error per item."""
+        # Publishes start in item order, so frames reach the broker in that order.
+        sem = asyncio.Semaphore(max(1, settings.outbox_publish_concurrency))
+
+        async def _one(item: Dict[str, Any]) -> None:
+            async with sem:
+                await self.publish(**item)
+
+        results = await asyncio.gather(*(_one(item) for item in items), return_exceptions=True)
+        return [r if isinstance(r, BaseException) else None for r in results]
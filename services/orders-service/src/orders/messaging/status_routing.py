@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+from uuid import UUID
+
+from aio_pika.abc import AbstractExchange, AbstractQueue
+
+from orders.config import settings
+from orders.metrics import LatencyStats
+
+# order.status.<user shard>.<order id>: a replica binds "order.status.*.<order id>" for
+# the orders it watches, or "order.status.<shard>.*" for a whole user shard.
+_PREFIX = "order.status"
+
+
+def status_routing_key(user_id: int, order_id: UUID | str) -> str:
+    return f"{_PREFIX}.{user_shard(user_id)}.{order_id}"
+
+
+def user_shard(user_id: int) -> int:
+    return user_id % settings.ws_user_shards
+
+
+def parse_routing_key(routing_key: str | None) -> Tuple[int, UUID] | None:
+    """(user shard, order id) of a status routing key, None for anything else."""
+    parts = (routing_key or "").split(".")
+    if len(parts) != 4 or f"{parts[0]}.{parts[1]}" != _PREFIX:
+        return None
+    try:
+        return int(parts[2]), UUID(parts[3])
+    except ValueError:
+        return None
+
+
+def _binding_key(kind: str, key: Hashable) -> str:
+    if kind == "order":
+        return f"{_PREFIX}.*.{key}"
+    if kind == "shard":
+        return f"{_PREFIX}.{key}.*"
+    raise ValueError(f"Unknown binding kind {kind!r}")
+
+
+class StatusBindings:
+    """Keeps the replica's ws queue bound to exactly the routing keys its sockets need.
+
+    Binds and unbinds go through one worker in call order, so the broker ends up in
+    the state of the last call even when a key flaps. Calls made before the queue is
+    attached are applied once it is. With WS_SELECTIVE_ROUTING=false the queue is
+    bound to every status event instead.
+
+    An unwatched key stays bound for WS_UNBIND_DELAY_SEC, so a reconnecting client
+    finds it still covered; `on_unbound` listeners hear when a key is really released.
+    """
+
+    def __init__(self) -> None:
+        self._queue: AbstractQueue | None = None
+        self._exchange: AbstractExchange | None = None
+        self._ops: asyncio.Queue[Tuple[str, str, asyncio.Future | None]] = asyncio.Queue()
+        self._keys: Dict[str, asyncio.Future] = {}
+        self._linger: Dict[str, asyncio.TimerHandle] = {}
+        self._worker: asyncio.Task | None = None
+        self.on_unbound: List[Callable[[str, Hashable], None]] = []
+        self.binds = 0
+        self.unbinds = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.bind = LatencyStats()
+
+    async def attach(self, queue: AbstractQueue, exchange: AbstractExchange) -> None:
+        self._queue = queue
+        self._exchange = exchange
+        if not settings.ws_selective_routing:
+            await queue.bind(exchange, routing_key=f"{_PREFIX}.#")
+            return
+        self._worker = asyncio.create_task(self._run())
+
+    async def detach(self) -> None:
+        self._queue = None
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def covers(self, order_id: UUID, user_id: int) -> bool:
+        """True if the queue is bound to this order's events, so nothing about it is missed."""
+        return self._bound(_binding_key("order", order_id)) or self.covers_user(user_id)
+
+    def covers_user(self, user_id: int) -> bool:
+        return self._bound(_binding_key("shard", user_shard(user_id)))
+
+    def _bound(self, key: str) -> bool:
+        if self._queue is None:
+            return False
+        if not settings.ws_selective_routing:
+            return True
+        done = self._keys.get(key)
+        return done is not None and done.done()
+
+    async def watch(self, kind: str, key: Hashable) -> None:
+        """Returns once the binding exists (or WS_BIND_TIMEOUT_SEC passed), so nothing published after is missed."""
+        if not settings.ws_selective_routing:
+            return
+        key = _binding_key(kind, key)
+        linger = self._linger.pop(key, None)
+        if linger is not None:
+            linger.cancel()
+        done = self._keys.get(key)
+        if done is None:
+            done = self._keys[key] = asyncio.get_running_loop().create_future()
+            self._ops.put_nowait(("bind", key, done))
+        elif done.done():
+            # Already bound: return without yielding, so callers can act on the
+            # subscription atomically (see the replay in the ws routes).
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(done), settings.ws_bind_timeout_sec)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+
+    def unwatch(self, kind: str, key: Hashable) -> None:
+        binding = _binding_key(kind, key)
+        if binding in self._keys and binding not in self._linger:
+            self._linger[binding] = asyncio.get_running_loop().call_later(
+                settings.ws_unbind_delay_sec, self._release, binding, kind, key
+            )
+
+    def _release(self, binding: str, kind: str, key: Hashable) -> None:
+        self._linger.pop(binding, None)
+        if self._keys.pop(binding, None) is not None:
+            self._ops.put_nowait(("unbind", binding, None))
+            for listener in self.on_unbound:
+                listener(kind, key)
+
+    async def _run(self) -> None:
+        assert self._queue is not None and self._exchange is not None
+        while True:
+            op, key, done = await self._ops.get()
+            started = time.perf_counter()
+            try:
+                if op == "bind":
+                    await self._queue.bind(self._exchange, routing_key=key)
+                    self.binds += 1
+                    self.bind.observe(time.perf_counter() - started)
+                else:
+                    await self._queue.unbind(self._exchange, routing_key=key)
+                    self.unbinds += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failures += 1
+                if op == "bind" and self._keys.get(key) is done:
+                    # Let the next watch retry.
+                    del self._keys[key]
+            if done is not None and not done.done():
+                done.set_result(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "selective": settings.ws_selective_routing,
+            "bound_keys": len(self._keys),
+            "lingering_keys": len(self._linger),
+            "pending_ops": self._ops.qsize(),
+            "binds": self.binds,
+            "unbinds": self.unbinds,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "bind": self.bind.snapshot(),
+        }
+
+
+status_bindings = StatusBindings()
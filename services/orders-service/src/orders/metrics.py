@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+
+class LatencyStats:
+    __slots__ = ("count", "total", "max", "last")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "max_ms": round(self.max * 1000, 3),
+            "last_ms": round(self.last * 1000, 3),
+        }
+
+
+class OutboxStats:
+    def __init__(self) -> None:
+        self.published = 0
+        self.failed = 0
+        self.parked = 0
+        self.wakeups = 0
+        self.batch_size = 0
+        self.fast_path_published = 0
+        # Rows the fast path handed back to the poller (locked, ordered behind another row, failed).
+        self.fast_path_left = 0
+        self.insert_to_publish = LatencyStats()
+        self.batch_publish = LatencyStats()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "published": self.published,
+            "failed": self.failed,
+            "parked": self.parked,
+            "wakeups": self.wakeups,
+            "batch_size": self.batch_size,
+            "fast_path_published": self.fast_path_published,
+            "fast_path_left": self.fast_path_left,
+            "insert_to_publish": self.insert_to_publish.snapshot(),
+            "batch_publish": self.batch_publish.snapshot(),
+        }
+
+
+class RetentionStats:
+    def __init__(self) -> None:
+        self.outbox_pruned = 0
+        self.outbox_archived = 0
+        self.archive_pruned = 0
+        self.inbox_pruned = 0
+        self.runs = 0
+        self.last_run = LatencyStats()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "outbox_pruned": self.outbox_pruned,
+            "outbox_archived": self.outbox_archived,
+            "archive_pruned": self.archive_pruned,
+            "inbox_pruned": self.inbox_pruned,
+            "runs": self.runs,
+            "run": self.last_run.snapshot(),
+        }
+
+
+class InboxStats:
+    def __init__(self) -> None:
+        self.cache_hits = 0
+        self.db_duplicates = 0
+        self.inserted = 0
+        self.insert = LatencyStats()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "cache_hits": self.cache_hits,
+            "db_duplicates": self.db_duplicates,
+            "inserted": self.inserted,
+            "insert": self.insert.snapshot(),
+        }
+
+
+class WsStats:
+    def __init__(self) -> None:
+        self.enqueued = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.send_failures = 0
+        self.send = LatencyStats()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "send_failures": self.send_failures,
+            "send": self.send.snapshot(),
+        }
+
+
+outbox_stats = OutboxStats()
+retention_stats = RetentionStats()
+inbox_stats = InboxStats()
+ws_stats = WsStats()
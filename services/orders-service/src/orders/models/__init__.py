@@ -1,5 +1,7 @@
 from orders.models.order import Order, OrderStatus
-from orders.models.outbox import OutboxMessage
+from orders.models.outbox import OUTBOX_PARTITIONS, OutboxMessage
+from orders.models.outbox_archive import OutboxArchiveMessage
+from orders.models.outbox_partition import OutboxPartition, OutboxWorker
 from orders.models.inbox import InboxMessage
 
-__all__ = ["Order", "OrderStatus", "OutboxMessage", "InboxMessage"]
+__all__ = ["Order", "OrderStatus", "OutboxMessage", "OUTBOX_PARTITIONS", "OutboxArchiveMessage", "OutboxPartition", "OutboxWorker", "InboxMessage"]
@@ -13,5 +13,5 @@ class InboxMessage(Base):
     __tablename__ = "inbox_messages"
 
     message_id: Mapped[str] = mapped_column(String(128), primary_key=True)
-    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
-    received_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    payload: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    received_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -4,7 +4,7 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Enum, Integer, String, func
+from sqlalchemy import BigInteger, DateTime, Enum, Index, Integer, Sequence, String, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -21,11 +21,27 @@ class Order(Base):
     __tablename__ = "orders"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
     amount: Mapped[int] = mapped_column(Integer, nullable=False)
     description: Mapped[str] = mapped_column(String(255), nullable=False)
 
     status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus, name="order_status"), nullable=False, default=OrderStatus.NEW)
+    # seq of the last order.status event, carried by snapshots so clients can resume from them.
+    status_seq: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+# Ids of order.status events: unique, and increasing for the events of one order.
+order_status_event_seq = Sequence("order_status_event_seq", metadata=Base.metadata)
+
+
+# Keyset pages of a user's orders, newest first; status rides along for filtering.
+Index(
+    "ix_orders_user_created",
+    Order.user_id,
+    Order.created_at.desc(),
+    Order.id.desc(),
+    postgresql_include=["status"],
+)
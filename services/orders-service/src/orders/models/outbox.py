@@ -3,23 +3,54 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Integer, String, func
+from sqlalchemy import Computed, DateTime, Index, Integer, String, func, text
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
 from orders.db.base import Base
 
+# Outbox rows are hashed into a fixed number of partitions by aggregate key
+# (order_id). Changing it re-partitions stored rows, so it is schema, not config.
+OUTBOX_PARTITIONS = 64
+
 
 class OutboxMessage(Base):
     __tablename__ = "outbox_messages"
+    __table_args__ = (
+        # Publishers only look at pending rows, retention only at published ones.
+        Index(
+            "ix_outbox_pending",
+            "partition",
+            "created_at",
+            "id",
+            postgresql_where=text("published_at IS NULL AND parked_at IS NULL"),
+        ),
+        Index(
+            "ix_outbox_pending_aggregate_key",
+            "aggregate_key",
+            postgresql_where=text("published_at IS NULL AND parked_at IS NULL"),
+        ),
+        Index("ix_outbox_published_at", "published_at", postgresql_where=text("published_at IS NOT NULL")),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     exchange: Mapped[str] = mapped_column(String(128), nullable=False)
     routing_key: Mapped[str] = mapped_column(String(128), nullable=False)
     payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
 
+    aggregate_key: Mapped[str | None] = mapped_column(String(128), Computed("payload->>'order_id'", persisted=True))
+    partition: Mapped[int] = mapped_column(
+        Integer,
+        Computed(
+            f"(hashtext(coalesce(payload->>'order_id', id::text)) & 2147483647) % {OUTBOX_PARTITIONS}",
+            persisted=True,
+        ),
+    )
+
     attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     last_error: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    parked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    published_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+    published_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
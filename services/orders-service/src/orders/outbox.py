@@ -1,44 +1,573 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timezone
-from typing import Optional
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
 
-from sqlalchemy import select
+import asyncpg
+from sqlalchemy import case, delete, event, exists, func, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, aliased
 
 from orders.config import settings
-from orders.models.outbox import OutboxMessage
+from orders.metrics import outbox_stats
+from orders.models.outbox import OUTBOX_PARTITIONS, OutboxMessage
+from orders.models.outbox_partition import OutboxPartition, OutboxWorker
 from orders.messaging.rabbit import Rabbit
 
+# Must match the channel used by the outbox_messages_notify() trigger.
+OUTBOX_NOTIFY_CHANNEL = "outbox_messages"
 
-async def outbox_publisher_loop(session_factory: async_sessionmaker, rabbit: Rabbit, stop_event: asyncio.Event) -> None:
-    while not stop_event.is_set():
+
+class OutboxListener:
+    """LISTENs for outbox_messages inserts and wakes the publisher loops."""
+
+    def __init__(self, database_url: str, channel: str = OUTBOX_NOTIFY_CHANNEL) -> None:
+        self._dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._channel = channel
+        self._events: List[asyncio.Event] = []
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+
+    def subscribe(self) -> asyncio.Event:
+        event = asyncio.Event()
+        self._events.append(event)
+        return event
+
+    async def wait(self, event: asyncio.Event) -> None:
+        # While LISTEN is up the poll is only a safety net; otherwise fall back to the regular interval.
+        timeout = settings.outbox_safety_poll_interval_sec if self.connected else settings.outbox_poll_interval_sec
         try:
-            async with session_factory() as session:
-                async with session.begin():
-                    result = await session.execute(
-                        select(OutboxMessage)
-                        .where(OutboxMessage.published_at.is_(None))
-                        .order_by(OutboxMessage.created_at.asc())
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _notify(self, *_args) -> None:
+        outbox_stats.wakeups += 1
+        for event in self._events:
+            event.set()
+
+    async def _run(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self._dsn)
+                await conn.add_listener(self._channel, self._notify)
+                self.connected = True
+                # Rows inserted while we were not listening would otherwise wait for the next poll.
+                self._notify()
+                while True:
+                    await asyncio.sleep(settings.outbox_listener_keepalive_sec)
+                    await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(1.0)
+            finally:
+                self.connected = False
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+
+
+class PartitionLease:
+    """Lease-based ownership of outbox partitions, balanced across all live publisher workers."""
+
+    def __init__(self, worker_id: str) -> None:
+        self.worker_id = worker_id
+        self.owned: List[int] = []
+        self._renewed_at = 0.0
+
+    def due(self) -> bool:
+        return time.monotonic() - self._renewed_at >= settings.outbox_lease_renew_sec
+
+    async def rebalance(self, session_factory: async_sessionmaker) -> None:
+        ttl = timedelta(seconds=settings.outbox_lease_ttl_sec)
+        async with session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    pg_insert(OutboxWorker)
+                    .values(worker_id=self.worker_id, heartbeat_at=func.now())
+                    .on_conflict_do_update(index_elements=["worker_id"], set_={"heartbeat_at": func.now()})
+                )
+                stale = (
+                    select(OutboxWorker.worker_id)
+                    .where(OutboxWorker.heartbeat_at < func.now() - ttl)
+                    .with_for_update(skip_locked=True)
+                    .scalar_subquery()
+                )
+                await session.execute(delete(OutboxWorker).where(OutboxWorker.worker_id.in_(stale)))
+                live = (await session.execute(select(func.count()).select_from(OutboxWorker))).scalar_one()
+                fair_share = -(-OUTBOX_PARTITIONS // max(live, 1))
+
+                owned = sorted(
+                    (
+                        await session.execute(
+                            update(OutboxPartition)
+                            .where(OutboxPartition.owner == self.worker_id)
+                            .values(lease_expires_at=func.now() + ttl)
+                            .returning(OutboxPartition.partition)
+                        )
+                    ).scalars()
+                )
+                if len(owned) > fair_share:
+                    await session.execute(
+                        update(OutboxPartition)
+                        .where(OutboxPartition.partition.in_(owned[fair_share:]), OutboxPartition.owner == self.worker_id)
+                        .values(owner=None, lease_expires_at=None)
+                    )
+                    owned = owned[:fair_share]
+                elif len(owned) < fair_share:
+                    free = (
+                        select(OutboxPartition.partition)
+                        .where(or_(OutboxPartition.owner.is_(None), OutboxPartition.lease_expires_at < func.now()))
+                        .order_by(OutboxPartition.partition)
+                        .limit(fair_share - len(owned))
                         .with_for_update(skip_locked=True)
-                        .limit(50)
+                        .scalar_subquery()
+                    )
+                    claimed = await session.execute(
+                        update(OutboxPartition)
+                        .where(OutboxPartition.partition.in_(free))
+                        .values(owner=self.worker_id, lease_expires_at=func.now() + ttl)
+                        .returning(OutboxPartition.partition)
+                    )
+                    owned = sorted(owned + list(claimed.scalars()))
+        self.owned = owned
+        self._renewed_at = time.monotonic()
+
+    async def release(self, session_factory: async_sessionmaker) -> None:
+        async with session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    update(OutboxPartition)
+                    .where(OutboxPartition.owner == self.worker_id)
+                    .values(owner=None, lease_expires_at=None)
+                )
+                await session.execute(delete(OutboxWorker).where(OutboxWorker.worker_id == self.worker_id))
+        self.owned = []
+
+
+class _BatchSizer:
+    def __init__(self) -> None:
+        self.size = settings.outbox_batch_size_min
+
+    def update(self, claimed: int) -> None:
+        # Grow while batches come back full, shrink back once the backlog is drained.
+        if claimed >= self.size:
+            self.size = min(self.size * 2, settings.outbox_batch_size_max)
+        elif claimed < self.size // 2:
+            self.size = max(self.size // 2, settings.outbox_batch_size_min)
+        outbox_stats.batch_size = self.size
+
+
+async def _publish_batch(
+    session_factory: async_sessionmaker, rabbit: Rabbit, lease: PartitionLease, batch_size: int
+) -> tuple[int, int]:
+    async with session_factory() as session:
+        async with session.begin():
+            # FOR SHARE fences the lease: a worker taking over an expired partition
+            # blocks (SKIP LOCKED) until this batch has committed.
+            owned = list(
+                (
+                    await session.execute(
+                        select(OutboxPartition.partition)
+                        .where(
+                            OutboxPartition.owner == lease.worker_id,
+                            OutboxPartition.lease_expires_at > func.now(),
+                        )
+                        .with_for_update(read=True)
+                    )
+                ).scalars()
+            )
+            if not owned:
+                return 0, 0
+
+            result = await session.execute(
+                select(
+                    OutboxMessage.id,
+                    OutboxMessage.exchange,
+                    OutboxMessage.routing_key,
+                    OutboxMessage.payload,
+                    OutboxMessage.aggregate_key,
+                    OutboxMessage.created_at,
+                )
+                .where(
+                    _pending(),
+                    OutboxMessage.partition.in_(owned),
+                    _due(),
+                    ~_blocked_by_earlier(),
+                )
+                .order_by(OutboxMessage.created_at.asc(), OutboxMessage.id.asc())
+                .with_for_update(skip_locked=True)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                return 0, 0
+
+            started = time.perf_counter()
+            published_ids, failed = await _publish_waves(rabbit, rows)
+            now = datetime.now(timezone.utc)
+            outbox_stats.batch_publish.observe(time.perf_counter() - started)
+
+            if published_ids:
+                await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(published_ids))
+                    .values(published_at=now, attempts=OutboxMessage.attempts + 1, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            parked = 0
+            for last_error, ids in failed.items():
+                result = await session.execute(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(ids))
+                    .values(
+                        attempts=OutboxMessage.attempts + 1,
+                        last_error=last_error,
+                        next_attempt_at=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, _retry_delay()),
+                        parked_at=case((OutboxMessage.attempts + 1 >= settings.outbox_max_attempts, func.now()), else_=None),
                     )
-                    messages = list(result.scalars().all())
-
-                    for msg in messages:
-                        msg.attempts += 1
-                        try:
-                            await rabbit.publish(
-                                exchange=msg.exchange,
-                                routing_key=msg.routing_key,
-                                payload=msg.payload,
-                                message_id=str(msg.id),
+                    .returning(OutboxMessage.parked_at)
+                    .execution_options(synchronize_session=False)
+                )
+                parked += sum(1 for parked_at in result.scalars() if parked_at is not None)
+
+    outbox_stats.published += len(published_ids)
+    outbox_stats.failed += sum(len(ids) for ids in failed.values())
+    outbox_stats.parked += parked
+    return len(rows), len(published_ids)
+
+
+async def _publish_waves(rabbit: Rabbit, rows: List) -> Tuple[List, Dict[str, List]]:
+    """Publishes rows in created_at order; returns the published ids and the failed ones by error."""
+    # Rows of one aggregate are published in waves (first of every key, then
+    # the second, ...) so a failure never lets a later event overtake it.
+    by_key: Dict[str, List] = {}
+    for row in rows:
+        by_key.setdefault(row.aggregate_key or str(row.id), []).append(row)
+
+    published_ids = []
+    failed: Dict[str, List] = {}
+    blocked = set()
+    wave = 0
+    while True:
+        batch = [
+            (key, group[wave]) for key, group in by_key.items() if wave < len(group) and key not in blocked
+        ]
+        if not batch:
+            break
+        errors = await rabbit.publish_many(
+            [
+                {
+                    "exchange": row.exchange,
+                    "routing_key": row.routing_key,
+                    "payload": row.payload,
+                    "message_id": str(row.id),
+                }
+                for _, row in batch
+            ]
+        )
+        now = datetime.now(timezone.utc)
+        for (key, row), error in zip(batch, errors):
+            if error is None:
+                published_ids.append(row.id)
+                outbox_stats.insert_to_publish.observe((now - row.created_at).total_seconds())
+            else:
+                blocked.add(key)
+                failed.setdefault(str(error)[:500], []).append(row.id)
+        wave += 1
+    return published_ids, failed
+
+
+def _pending():
+    return OutboxMessage.published_at.is_(None) & OutboxMessage.parked_at.is_(None)
+
+
+def _due():
+    return or_(OutboxMessage.next_attempt_at.is_(None), OutboxMessage.next_attempt_at <= func.now())
+
+
+def _blocked_by_earlier():
+    # A row waits while an earlier event of the same aggregate is backing off,
+    # so retries never reorder events; unrelated rows keep flowing.
+    earlier = aliased(OutboxMessage)
+    return exists().where(
+        earlier.aggregate_key == OutboxMessage.aggregate_key,
+        earlier.published_at.is_(None),
+        earlier.parked_at.is_(None),
+        earlier.next_attempt_at > func.now(),
+        tuple_(earlier.created_at, earlier.id) < tuple_(OutboxMessage.created_at, OutboxMessage.id),
+    )
+
+
+def _retry_delay():
+    # Exponential backoff on the attempts made so far, capped, with +-20% jitter.
+    delay = func.least(settings.outbox_retry_base_sec * func.power(2, OutboxMessage.attempts), settings.outbox_retry_max_sec)
+    return delay * (0.8 + func.random() * 0.4)
+
+
+def _waiting_on_earlier(ids: List[uuid.UUID]):
+    # An earlier pending row of the aggregate written by another transaction goes first, via the poller.
+    earlier = aliased(OutboxMessage)
+    return exists().where(
+        earlier.aggregate_key == OutboxMessage.aggregate_key,
+        earlier.published_at.is_(None),
+        earlier.parked_at.is_(None),
+        earlier.id.not_in(ids),
+        tuple_(earlier.created_at, earlier.id) < tuple_(OutboxMessage.created_at, OutboxMessage.id),
+    )
+
+
+_TRACKED = "outbox_fast_path"
+
+
+class OutboxFastPath:
+    """Publishes outbox rows as soon as the transaction that wrote them commits.
+
+    Writers `track` the ids of the rows they insert. On commit the ids are queued and
+    published under the same locks the poller takes (partition, then row, both SKIP
+    LOCKED), then marked published. Rows it skips, fails to publish or loses with the
+    process stay pending for the poller, so delivery is still at least once.
+    """
+
+    def __init__(self, max_pending: int) -> None:
+        self.max_pending = max_pending
+        self.session_factory: async_sessionmaker | None = None
+        self.rabbit: Rabbit | None = None
+        self._pending: Deque[uuid.UUID] = deque()
+        self._task: asyncio.Task | None = None
+
+    def start(self, session_factory: async_sessionmaker, rabbit: Rabbit) -> None:
+        self.session_factory = session_factory
+        self.rabbit = rabbit
+        # Process-wide session hooks, so only installed while the fast path is on.
+        event.listen(Session, "after_commit", self._committed)
+        event.listen(Session, "after_rollback", self._rolled_back)
+
+    async def stop(self) -> None:
+        if self.rabbit is not None:
+            event.remove(Session, "after_commit", self._committed)
+            event.remove(Session, "after_rollback", self._rolled_back)
+        self.rabbit = None
+        self._pending.clear()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def track(self, session, ids: List[uuid.UUID]) -> None:
+        if self.rabbit is not None:
+            session.info.setdefault(_TRACKED, []).extend(ids)
+
+    def _committed(self, session: Session) -> None:
+        ids = session.info.pop(_TRACKED, None)
+        if not ids or self.rabbit is None:
+            return
+        if len(self._pending) + len(ids) > self.max_pending:
+            outbox_stats.fast_path_left += len(ids)
+            return
+        self._pending.extend(ids)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def _rolled_back(self, session: Session) -> None:
+        session.info.pop(_TRACKED, None)
+
+    async def _run(self) -> None:
+        try:
+            while self._pending:
+                ids = [self._pending.popleft() for _ in range(min(len(self._pending), settings.outbox_batch_size_max))]
+                try:
+                    await self._publish(ids)
+                except Exception:
+                    outbox_stats.fast_path_left += len(ids)
+        finally:
+            self._task = None
+
+    async def _publish(self, ids: List[uuid.UUID]) -> None:
+        assert self.session_factory is not None and self.rabbit is not None
+        published_ids: List = []
+        async with self.session_factory() as session:
+            async with session.begin():
+                # A partition a poller is publishing (FOR SHARE) or rebalancing is left to
+                # it, so the two never interleave the events of one aggregate.
+                locked = list(
+                    (
+                        await session.execute(
+                            select(OutboxPartition.partition)
+                            .where(
+                                OutboxPartition.partition.in_(
+                                    select(OutboxMessage.partition).where(OutboxMessage.id.in_(ids))
+                                )
+                            )
+                            .with_for_update(skip_locked=True)
+                        )
+                    ).scalars()
+                )
+                if locked:
+                    rows = (
+                        await session.execute(
+                            select(
+                                OutboxMessage.id,
+                                OutboxMessage.exchange,
+                                OutboxMessage.routing_key,
+                                OutboxMessage.payload,
+                                OutboxMessage.aggregate_key,
+                                OutboxMessage.created_at,
+                            )
+                            .where(
+                                OutboxMessage.id.in_(ids),
+                                _pending(),
+                                _due(),
+                                OutboxMessage.partition.in_(locked),
+                                ~_waiting_on_earlier(ids),
                             )
-                            msg.published_at = datetime.now(timezone.utc)
-                            msg.last_error = None
-                        except Exception as e:
-                            msg.last_error = str(e)[:500]
-            await asyncio.sleep(settings.outbox_poll_interval_sec)
+                            .order_by(OutboxMessage.created_at.asc(), OutboxMessage.id.asc())
+                            .with_for_update(skip_locked=True)
+                        )
+                    ).all()
+                    if rows:
+                        # Failures are not recorded: the poller retries them with its backoff.
+                        published_ids, _ = await _publish_waves(self.rabbit, rows)
+                if published_ids:
+                    await session.execute(
+                        update(OutboxMessage)
+                        .where(OutboxMessage.id.in_(published_ids))
+                        .values(
+                            published_at=datetime.now(timezone.utc),
+                            attempts=OutboxMessage.attempts + 1,
+                            last_error=None,
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+        outbox_stats.published += len(published_ids)
+        outbox_stats.fast_path_published += len(published_ids)
+        outbox_stats.fast_path_left += len(ids) - len(published_ids)
+
+
+outbox_fast_path = OutboxFastPath(settings.outbox_fast_path_max_pending)
+
+
+async def list_parked(session_factory: async_sessionmaker, limit: int) -> List[Dict[str, Any]]:
+    async with session_factory() as session:
+        result = await session.execute(
+            select(OutboxMessage)
+            .where(OutboxMessage.parked_at.is_not(None), OutboxMessage.published_at.is_(None))
+            .order_by(OutboxMessage.parked_at.desc())
+            .limit(limit)
+        )
+        return [
+            {
+                "id": msg.id,
+                "routing_key": msg.routing_key,
+                "aggregate_key": msg.aggregate_key,
+                "attempts": msg.attempts,
+                "last_error": msg.last_error,
+                "created_at": msg.created_at,
+                "parked_at": msg.parked_at,
+            }
+            for msg in result.scalars()
+        ]
+
+
+async def requeue_parked(session_factory: async_sessionmaker, message_id: uuid.UUID) -> bool:
+    async with session_factory() as session:
+        async with session.begin():
+            result = await session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id == message_id, OutboxMessage.parked_at.is_not(None))
+                .values(parked_at=None, next_attempt_at=None, attempts=0, last_error=None)
+                .returning(OutboxMessage.id)
+            )
+            return result.scalar_one_or_none() is not None
+
+
+async def outbox_partition_status(session_factory: async_sessionmaker) -> Dict[str, Any]:
+    async with session_factory() as session:
+        partitions = (await session.execute(select(OutboxPartition).order_by(OutboxPartition.partition))).scalars().all()
+        backlog = dict(
+            (
+                await session.execute(
+                    select(OutboxMessage.partition, func.count())
+                    .where(_pending())
+                    .group_by(OutboxMessage.partition)
+                )
+            ).all()
+        )
+        parked = dict(
+            (
+                await session.execute(
+                    select(OutboxMessage.partition, func.count())
+                    .where(OutboxMessage.published_at.is_(None), OutboxMessage.parked_at.is_not(None))
+                    .group_by(OutboxMessage.partition)
+                )
+            ).all()
+        )
+        workers = (await session.execute(select(OutboxWorker).order_by(OutboxWorker.worker_id))).scalars().all()
+    return {
+        "workers": [{"worker_id": w.worker_id, "heartbeat_at": w.heartbeat_at} for w in workers],
+        "partitions": [
+            {
+                "partition": p.partition,
+                "owner": p.owner,
+                "lease_expires_at": p.lease_expires_at,
+                "backlog": backlog.get(p.partition, 0),
+                "parked": parked.get(p.partition, 0),
+            }
+            for p in partitions
+        ],
+    }
+
+
+def outbox_worker_id(index: int) -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+async def outbox_publisher_loop(
+    session_factory: async_sessionmaker,
+    rabbit: Rabbit,
+    stop_event: asyncio.Event,
+    listener: Optional[OutboxListener] = None,
+    worker_id: str | None = None,
+) -> None:
+    wakeup = listener.subscribe() if listener else None
+    lease = PartitionLease(worker_id or outbox_worker_id(0))
+    sizer = _BatchSizer()
+    try:
+        while not stop_event.is_set():
+            try:
+                if lease.due():
+                    await lease.rebalance(session_factory)
+                batch_size = sizer.size
+                claimed, published = await _publish_batch(session_factory, rabbit, lease, batch_size)
+                sizer.update(claimed)
+                if published == batch_size:
+                    # Backlog left behind: keep draining instead of waiting.
+                    continue
+                if listener and wakeup:
+                    await listener.wait(wakeup)
+                else:
+                    await asyncio.sleep(settings.outbox_poll_interval_sec)
+            except Exception:
+                await asyncio.sleep(1.0)
+    finally:
+        try:
+            await lease.release(session_factory)
         except Exception:
-            await asyncio.sleep(1.0)
+            pass
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import sys
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, List, Tuple
+from uuid import UUID
+
+from orders.config import settings
+from orders.messaging.status_routing import StatusBindings, status_bindings, user_shard
+
+
+class _Ring:
+    __slots__ = ("user_id", "events")
+
+    def __init__(self, user_id: int, size: int) -> None:
+        self.user_id = user_id
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=size)
+
+
+class ReplayBuffer:
+    """Recent order.status events per order and per user, replayed to clients resuming from a seq.
+
+    A ring only lives while the replica is bound to its events, so if it still holds
+    the client's last event, it holds everything after it. Otherwise (rolled over,
+    evicted, or never seen here) the caller falls back to a snapshot.
+    """
+
+    def __init__(self, order_events: int, user_events: int, max_rings: int, bindings: StatusBindings) -> None:
+        self.order_events = order_events
+        self.user_events = user_events
+        self.max_rings = max_rings
+        self.bindings = bindings
+        self._orders: OrderedDict[UUID, _Ring] = OrderedDict()
+        self._users: OrderedDict[int, _Ring] = OrderedDict()
+        self.replays = 0
+        self.replayed_events = 0
+        self.fallbacks = 0
+        self.evictions = 0
+
+    def record(self, order_id: UUID, user_id: int, seq: int | None, message: str) -> None:
+        if seq is None or self.max_rings <= 0:
+            return
+        if self.bindings.covers(order_id, user_id):
+            self._append(self._orders, order_id, user_id, self.order_events, seq, message)
+        if self.bindings.covers_user(user_id):
+            self._append(self._users, user_id, user_id, self.user_events, seq, message)
+
+    def _append(self, rings: OrderedDict, key: Hashable, user_id: int, size: int, seq: int, message: str) -> None:
+        ring = rings.get(key)
+        if ring is None:
+            ring = rings[key] = _Ring(user_id, size)
+            while len(rings) > self.max_rings:
+                rings.popitem(last=False)
+                self.evictions += 1
+        else:
+            rings.move_to_end(key)
+        ring.events.append((seq, message))
+
+    def since(self, kind: str, key: Hashable, last_seq: int) -> List[str] | None:
+        """Events after `last_seq`, oldest first; None if the ring cannot vouch for the gap."""
+        ring = (self._orders if kind == "order" else self._users).get(key)
+        if ring is not None:
+            events = list(ring.events)
+            for i, (seq, _) in enumerate(events):
+                if seq == last_seq:
+                    self.replays += 1
+                    self.replayed_events += len(events) - i - 1
+                    return [message for _, message in events[i + 1:]]
+        self.fallbacks += 1
+        return None
+
+    def forget(self, kind: str, key: Hashable) -> None:
+        """Drops rings whose events are no longer all received (see StatusBindings.on_unbound)."""
+        if kind == "order":
+            ring = self._orders.get(key)
+            if ring is not None and not self.bindings.covers(key, ring.user_id):
+                del self._orders[key]
+            return
+        for user_id in [u for u in self._users if user_shard(u) == key]:
+            del self._users[user_id]
+        for order_id in [o for o, ring in self._orders.items() if not self.bindings.covers(o, ring.user_id)]:
+            del self._orders[order_id]
+
+    def clear(self) -> None:
+        self._orders.clear()
+        self._users.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        rings = list(self._orders.values()) + list(self._users.values())
+        approx_bytes = sum(
+            sys.getsizeof(ring) + sys.getsizeof(ring.events) + sum(sys.getsizeof(m) for _, m in ring.events)
+            for ring in rings
+        )
+        return {
+            "order_rings": len(self._orders),
+            "user_rings": len(self._users),
+            "events": sum(len(ring.events) for ring in rings),
+            "replays": self.replays,
+            "replayed_events": self.replayed_events,
+            "fallbacks": self.fallbacks,
+            "evictions": self.evictions,
+            "approx_bytes": approx_bytes,
+        }
+
+
+replay_buffer = ReplayBuffer(
+    settings.ws_replay_order_events, settings.ws_replay_user_events, settings.ws_replay_max_rings, status_bindings
+)
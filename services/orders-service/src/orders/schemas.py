@@ -6,6 +6,7 @@ from typing import Literal
 
 from pydantic import BaseModel, Field
 
+from orders.config import settings
 from orders.models.order import OrderStatus
 
 
@@ -28,6 +29,28 @@ class OrderRead(BaseModel):
         from_attributes = True
 
 
+class OrderBatchCreate(BaseModel):
+    # Items are validated one by one so that a bad item fails alone.
+    orders: list[dict] = Field(..., min_length=1, max_length=settings.orders_batch_max_size)
+
+
+class OrderBatchItemResult(BaseModel):
+    index: int
+    order: OrderRead | None = None
+    error: str | None = None
+
+
+class OrderBatchResult(BaseModel):
+    created: int
+    results: list[OrderBatchItemResult]
+
+
+class OrderPage(BaseModel):
+    items: list[OrderRead]
+    # Opaque; pass back as ?cursor= for the next page. None on the last page.
+    next_cursor: str | None = None
+
+
 class PaymentResultEvent(BaseModel):
     event_id: str
     type: Literal["payment.result"]
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+from uuid import UUID
+
+from orders.config import settings
+from orders.messaging.status_routing import StatusBindings, status_bindings, user_shard
+from orders.models.order import OrderStatus
+
+_TERMINAL = frozenset({OrderStatus.FINISHED.value, OrderStatus.CANCELLED.value})
+
+
+class OrderStatusCache:
+    """Bounded LRU of the latest order.status message per order, for WebSocket snapshots.
+
+    Finished and cancelled orders never change, so those entries are always good. An
+    open order's entry is only served while the replica receives that order's events
+    (its order or user shard is bound); it is dropped when the binding goes and on a
+    broker reconnect, since events may have been missed.
+    """
+
+    def __init__(self, max_entries: int, bindings: StatusBindings) -> None:
+        self.max_entries = max_entries
+        self.bindings = bindings
+        # order_id -> (user_id, status, encoded message)
+        self._entries: OrderedDict[UUID, Tuple[int, str, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.uncovered = 0
+        self.updates = 0
+        self.fills = 0
+        self.evictions = 0
+
+    def get(self, order_id: UUID) -> str | None:
+        entry = self._entries.get(order_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, status, message = entry
+        if status not in _TERMINAL and not self.bindings.covers(order_id, user_id):
+            self.uncovered += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(order_id)
+        self.hits += 1
+        return message
+
+    def put(self, order_id: UUID, user_id: int, status: str, message: str, from_event: bool = False) -> None:
+        if self.max_entries <= 0:
+            return
+        current = self._entries.get(order_id)
+        if current is not None and current[1] in _TERMINAL and status not in _TERMINAL:
+            # Statuses only move NEW -> terminal: this is an older read.
+            return
+        if status not in _TERMINAL and not self.bindings.covers(order_id, user_id):
+            return
+        self._entries[order_id] = (user_id, status, message)
+        self._entries.move_to_end(order_id)
+        if from_event:
+            self.updates += 1
+        else:
+            self.fills += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def forget(self, kind: str, key: Hashable) -> None:
+        """Drops open orders no longer covered by a binding (see StatusBindings.on_unbound)."""
+        if kind == "order":
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] not in _TERMINAL:
+                del self._entries[key]
+        elif kind == "shard":
+            for order_id in [
+                o for o, (user_id, status, _) in self._entries.items()
+                if status not in _TERMINAL and user_shard(user_id) == key
+            ]:
+                del self._entries[order_id]
+
+    def clear_open(self) -> None:
+        for order_id in [o for o, (_, status, _) in self._entries.items() if status not in _TERMINAL]:
+            del self._entries[order_id]
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        approx_bytes = sys.getsizeof(self._entries) + sum(
+            sys.getsizeof(k) + sys.getsizeof(v) + sys.getsizeof(v[2]) for k, v in self._entries.items()
+        )
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            # Misses on an open order whose events this replica does not receive.
+            "uncovered": self.uncovered,
+            "fills": self.fills,
+            "updates": self.updates,
+            "evictions": self.evictions,
+            "approx_bytes": approx_bytes,
+            "bytes_per_entry": round(approx_bytes / len(self._entries), 1) if self._entries else None,
+        }
+
+
+status_cache = OrderStatusCache(settings.order_status_cache_size, status_bindings)
@@ -1,39 +1,296 @@
 from __future__ import annotations
 
 import asyncio
-from collections import defaultdict
-from typing import DefaultDict, Set
+import sys
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Set
 from uuid import UUID
 
 from fastapi import WebSocket
 
+from orders.config import settings
+from orders.messaging.status_routing import user_shard
+from orders.metrics import ws_stats
+
+_CLOSE = None
+
+
+class _Connection:
+    """A client socket, its subscriptions and its pending messages.
+
+    Kept small for idle watchers: the queue and subscription sets are created on first
+    use, and the queue and writer task only exist while there is something to send.
+    """
+
+    __slots__ = ("websocket", "pending", "orders", "users", "writer", "evicted")
+
+    def __init__(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        self.pending: Deque[str | None] | None = None
+        self.orders: Set[UUID] | None = None
+        self.users: Set[int] | None = None
+        self.writer: asyncio.Task | None = None
+        self.evicted = False
+
+
+class StatusSink:
+    """Stands in for a WebSocket in ConnectionManager for plain HTTP watchers (long-poll, SSE).
+
+    An idle sink is a small object and an empty deque: no socket and no task.
+    """
+
+    __slots__ = ("messages", "closed", "_wakeup")
 
-class ConnectionManager:
     def __init__(self) -> None:
-        self._connections: DefaultDict[UUID, Set[WebSocket]] = defaultdict(set)
-        self._lock = asyncio.Lock()
+        self.messages: Deque[str] = deque()
+        self.closed = False
+        self._wakeup: asyncio.Future | None = None
+
+    async def send_text(self, message: str) -> None:
+        if len(self.messages) >= settings.ws_send_queue_size:
+            # The watcher stopped reading; the manager drops it like a stalled socket.
+            raise RuntimeError("HTTP status watcher is not reading")
+        self.messages.append(message)
+        self._wake()
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def next(self, timeout: float) -> str | None:
+        """The next message, or None after `timeout` seconds or once closed."""
+        if not self.messages and not self.closed:
+            self._wakeup = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self._wakeup, max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._wakeup = None
+        return self.messages.popleft() if self.messages else None
+
+
+class ConnectionManager:
+    """Fans order.status messages out to subscribed sockets without awaiting any of them.
+
+    Sockets subscribe to single orders or to all orders of a user. `broadcast` only
+    enqueues; each socket's writer sends in order, so a slow client never delays the
+    others or the consumer. A full queue either drops its oldest message ("drop") or
+    closes the socket ("disconnect").
+
+    `on_watch(kind, key)` is awaited on every subscribe ("order", order_id or
+    "shard", user shard) and `on_unwatch(kind, key)` called when the last local
+    subscriber goes, so the replica only receives what it needs.
+    """
+
+    def __init__(
+        self,
+        queue_size: int,
+        slow_policy: str,
+        send_timeout_sec: float,
+        on_watch: Callable[[str, Hashable], Awaitable[None]] | None = None,
+        on_unwatch: Callable[[str, Hashable], None] | None = None,
+    ) -> None:
+        if slow_policy not in ("drop", "disconnect"):
+            raise ValueError(f"Unknown slow consumer policy {slow_policy!r}")
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self.send_timeout_sec = send_timeout_sec
+        self.on_watch = on_watch
+        self.on_unwatch = on_unwatch
+        self._connections: Dict[WebSocket, _Connection] = {}
+        self._by_order: Dict[UUID, Set[_Connection]] = {}
+        self._by_user: Dict[int, Set[_Connection]] = {}
+        # Watched users per shard: events of other shards never need their body parsed.
+        self._shards: Dict[int, int] = {}
 
     async def connect(self, order_id: UUID, websocket: WebSocket) -> None:
         await websocket.accept()
-        async with self._lock:
-            self._connections[order_id].add(websocket)
+        await self.subscribe(order_id, websocket)
+
+    def register(self, websocket: WebSocket) -> _Connection:
+        conn = self._connections.get(websocket)
+        if conn is None:
+            conn = self._connections[websocket] = _Connection(websocket)
+        return conn
+
+    async def subscribe(self, order_id: UUID, websocket: WebSocket) -> None:
+        conn = self.register(websocket)
+        if conn.orders is None:
+            conn.orders = set()
+        conn.orders.add(order_id)
+        self._by_order.setdefault(order_id, set()).add(conn)
+        if self.on_watch is not None:
+            await self.on_watch("order", order_id)
+
+    async def subscribe_user(self, user_id: int, websocket: WebSocket) -> None:
+        conn = self.register(websocket)
+        if conn.users is None:
+            conn.users = set()
+        conn.users.add(user_id)
+        subscribers = self._by_user.get(user_id)
+        if subscribers is None:
+            subscribers = self._by_user[user_id] = set()
+            shard = user_shard(user_id)
+            self._shards[shard] = self._shards.get(shard, 0) + 1
+        subscribers.add(conn)
+        if self.on_watch is not None:
+            await self.on_watch("shard", user_shard(user_id))
 
     async def disconnect(self, order_id: UUID, websocket: WebSocket) -> None:
-        async with self._lock:
-            if websocket in self._connections.get(order_id, set()):
-                self._connections[order_id].remove(websocket)
-            if not self._connections.get(order_id):
-                self._connections.pop(order_id, None)
-
-    async def broadcast(self, order_id: UUID, message: str) -> None:
-        async with self._lock:
-            conns = list(self._connections.get(order_id, set()))
-        for ws in conns:
-            try:
-                await ws.send_text(message)
-            except Exception:
+        conn = self._connections.get(websocket)
+        if conn is not None and conn.orders:
+            conn.orders.discard(order_id)
+            self._unsubscribe_order(order_id, conn)
+
+    async def disconnect_user(self, user_id: int, websocket: WebSocket) -> None:
+        conn = self._connections.get(websocket)
+        if conn is not None and conn.users:
+            conn.users.discard(user_id)
+            self._unsubscribe_user(user_id, conn)
+
+    async def remove(self, websocket: WebSocket) -> None:
+        """Drops every subscription of the socket and stops its writer."""
+        conn = self._connections.pop(websocket, None)
+        if conn is None:
+            return
+        self._forget(conn)
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    def watches_shard(self, shard: int) -> bool:
+        return shard in self._shards
+
+    def send(self, websocket: WebSocket, message: str) -> None:
+        """Queues a snapshot for one socket behind whatever is already queued for it.
+
+        Not subject to the queue bound: snapshot bursts are bounded by the caller.
+        """
+        conn = self._connections.get(websocket)
+        if conn is None or conn.evicted:
+            return
+        self._push(conn, message)
+        ws_stats.enqueued += 1
+
+    async def broadcast(self, order_id: UUID, message: str, user_id: int | None = None) -> None:
+        # The same str object goes to every queue; nothing is encoded per subscriber.
+        conns = self._by_order.get(order_id, set())
+        if user_id is not None and user_id in self._by_user:
+            conns = conns | self._by_user[user_id]
+        for conn in list(conns):
+            self._enqueue(conn, message)
+
+    def _enqueue(self, conn: _Connection, message: str) -> None:
+        if conn.evicted:
+            return
+        if conn.pending is not None and len(conn.pending) >= self.queue_size:
+            if self.slow_policy == "disconnect":
+                self._evict(conn)
+                return
+            conn.pending.popleft()
+            ws_stats.dropped += 1
+        self._push(conn, message)
+        ws_stats.enqueued += 1
+
+    def _push(self, conn: _Connection, message: str | None) -> None:
+        if conn.pending is None:
+            conn.pending = deque()
+        conn.pending.append(message)
+        if conn.writer is None:
+            conn.writer = asyncio.create_task(self._writer(conn))
+
+    def _evict(self, conn: _Connection) -> None:
+        # The writer closes the socket once it gets the marker (or its current send times out).
+        conn.evicted = True
+        ws_stats.evicted += 1
+        self._forget(conn)
+        if conn.pending is not None:
+            conn.pending.clear()
+        self._push(conn, _CLOSE)
+
+    def _forget(self, conn: _Connection) -> None:
+        for order_id in conn.orders or ():
+            self._unsubscribe_order(order_id, conn)
+        for user_id in conn.users or ():
+            self._unsubscribe_user(user_id, conn)
+        conn.orders = conn.users = None
+
+    def _unsubscribe_order(self, order_id: UUID, conn: _Connection) -> None:
+        subscribers = self._by_order.get(order_id)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            if not subscribers:
+                del self._by_order[order_id]
+                if self.on_unwatch is not None:
+                    self.on_unwatch("order", order_id)
+
+    def _unsubscribe_user(self, user_id: int, conn: _Connection) -> None:
+        subscribers = self._by_user.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            if not subscribers:
+                del self._by_user[user_id]
+                shard = user_shard(user_id)
+                self._shards[shard] -= 1
+                if not self._shards[shard]:
+                    del self._shards[shard]
+                    if self.on_unwatch is not None:
+                        self.on_unwatch("shard", shard)
+
+    async def _writer(self, conn: _Connection) -> None:
+        """Drains the socket's queue and exits when it is empty."""
+        ws = conn.websocket
+        pending = conn.pending
+        assert pending is not None
+        try:
+            while pending:
+                message = pending.popleft()
+                if message is _CLOSE:
+                    break
+                started = time.perf_counter()
                 try:
-                    await ws.close()
+                    await asyncio.wait_for(ws.send_text(message), self.send_timeout_sec)
                 except Exception:
-                    pass
-                await self.disconnect(order_id, ws)
+                    ws_stats.send_failures += 1
+                    break
+                ws_stats.delivered += 1
+                ws_stats.send.observe(time.perf_counter() - started)
+            else:
+                conn.pending = None
+                return
+        finally:
+            conn.writer = None
+        await self.remove(ws)
+        try:
+            # 1013: try again later.
+            await ws.close(code=1013 if conn.evicted else 1000)
+        except Exception:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        conns = list(self._connections.values())
+        depths = [len(conn.pending) for conn in conns if conn.pending is not None]
+        per_connection = sum(
+            sys.getsizeof(conn)
+            + (sys.getsizeof(conn.pending) if conn.pending is not None else 0)
+            + (sys.getsizeof(conn.orders) if conn.orders is not None else 0)
+            + (sys.getsizeof(conn.users) if conn.users is not None else 0)
+            for conn in conns
+        )
+        return {
+            **ws_stats.snapshot(),
+            "connections": len(conns),
+            "writers": sum(1 for conn in conns if conn.writer is not None),
+            "orders": len(self._by_order),
+            "users": len(self._by_user),
+            "slow_policy": self.slow_policy,
+            "queue_size": self.queue_size,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "bytes_per_connection": round(per_connection / len(conns), 1) if conns else None,
+        }
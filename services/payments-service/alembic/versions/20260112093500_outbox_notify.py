@@ -0,0 +1,42 @@
+"""outbox notify trigger
+
+Revision ID: 20260112093500
+Revises: 20251224181334
+Create Date: 2026-01-12T09:35:00
+
+"""
+
+from alembic import op
+
+
+revision = "20260112093500"
+down_revision = "20251224181334"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Statement-level trigger: one NOTIFY per inserting statement, and Postgres
+    # folds duplicates within a transaction, so bulk inserts wake the publisher once.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION outbox_messages_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('outbox_messages', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_outbox_messages_notify
+        AFTER INSERT ON outbox_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION outbox_messages_notify()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_outbox_messages_notify ON outbox_messages")
+    op.execute("DROP FUNCTION IF EXISTS outbox_messages_notify()")
@@ -0,0 +1,46 @@
+"""inbox compaction
+
+Revision ID: 20260121110500
+Revises: 20260119095000
+Create Date: 2026-01-21T11:05:00
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "20260121110500"
+down_revision = "20260119095000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # message_id becomes the primary key: the surrogate id, the unique
+    # constraint and the extra index on message_id all go away.
+    op.drop_index("ix_inbox_message_id", table_name="inbox_messages")
+    op.drop_constraint("inbox_messages_message_id_key", "inbox_messages", type_="unique")
+    op.drop_constraint("inbox_messages_pkey", "inbox_messages", type_="primary")
+    op.drop_column("inbox_messages", "id")
+    op.create_primary_key("inbox_messages_pkey", "inbox_messages", ["message_id"])
+
+    op.alter_column("inbox_messages", "payload", existing_type=postgresql.JSONB(astext_type=sa.Text()), nullable=True)
+    op.create_index("ix_inbox_messages_received_at", "inbox_messages", ["received_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inbox_messages_received_at", table_name="inbox_messages")
+    op.execute("UPDATE inbox_messages SET payload = '{}'::jsonb WHERE payload IS NULL")
+    op.alter_column("inbox_messages", "payload", existing_type=postgresql.JSONB(astext_type=sa.Text()), nullable=False)
+
+    op.drop_constraint("inbox_messages_pkey", "inbox_messages", type_="primary")
+    op.add_column(
+        "inbox_messages",
+        sa.Column("id", postgresql.UUID(as_uuid=True), server_default=sa.text("gen_random_uuid()"), nullable=False),
+    )
+    op.alter_column("inbox_messages", "id", server_default=None)
+    op.create_primary_key("inbox_messages_pkey", "inbox_messages", ["id"])
+    op.create_unique_constraint("inbox_messages_message_id_key", "inbox_messages", ["message_id"])
+    op.create_index("ix_inbox_message_id", "inbox_messages", ["message_id"])
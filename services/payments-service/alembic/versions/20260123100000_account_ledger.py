@@ -0,0 +1,67 @@
+"""account ledger
+
+Revision ID: 20260123100000
+Revises: 20260121110500
+Create Date: 2026-01-23T10:00:00
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "20260123100000"
+down_revision = "20260121110500"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("accounts", sa.Column("stripes", sa.Integer(), server_default="1", nullable=False))
+
+    op.create_table(
+        "account_stripes",
+        sa.Column(
+            "user_id",
+            sa.Integer(),
+            sa.ForeignKey("accounts.user_id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("stripe", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("balance", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.CheckConstraint("balance >= 0", name="ck_account_stripes_balance_non_negative"),
+    )
+
+    op.create_table(
+        "account_ledger",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("stripe", sa.Integer(), nullable=False),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("order_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_account_ledger_user_id_id", "account_ledger", ["user_id", "id"])
+    op.create_index("ix_account_ledger_created_at", "account_ledger", ["created_at"])
+
+    # Existing balances become stripe 0 with an opening entry.
+    op.execute("INSERT INTO account_stripes (user_id, stripe, balance) SELECT user_id, 0, balance FROM accounts")
+    op.execute(
+        "INSERT INTO account_ledger (user_id, stripe, amount, kind) SELECT user_id, 0, balance, 'opening' FROM accounts"
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "UPDATE accounts a SET balance = s.total"
+        " FROM (SELECT user_id, sum(balance) AS total FROM account_stripes GROUP BY user_id) s"
+        " WHERE a.user_id = s.user_id"
+    )
+    op.drop_index("ix_account_ledger_created_at", table_name="account_ledger")
+    op.drop_index("ix_account_ledger_user_id_id", table_name="account_ledger")
+    op.drop_table("account_ledger")
+    op.drop_table("account_stripes")
+    op.drop_column("accounts", "stripes")
@@ -0,0 +1,96 @@
+"""Per-message latency of the payment request paths (single-statement CTE vs ORM).
+
+Runs against the database in DATABASE_URL; use a scratch database, the script
+creates a throwaway account and deletes everything it wrote afterwards.
+
+    cd services/payments-service
+    PYTHONPATH=src DATABASE_URL=... RABBITMQ_URL=amqp://unused python scripts/bench_debit_paths.py -n 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, text
+
+from payments.consumers import _process_payment_request, _process_payment_request_cte
+from payments.db.session import SessionLocal, engine
+from payments.ledger import create_stripes, credit
+from payments.models.account import Account
+from payments.models.inbox import InboxMessage
+from payments.models.ledger import LedgerEntry
+from payments.models.payment import Payment
+from payments.schemas import PaymentRequestEvent
+
+PATHS = {"cte": _process_payment_request_cte, "orm": _process_payment_request}
+
+
+async def _run_path(name: str, user_id: int, count: int, order_ids: list, msg_ids: list) -> list[float]:
+    process = PATHS[name]
+    latencies = []
+    for _ in range(count):
+        evt = PaymentRequestEvent(
+            event_id=str(uuid4()),
+            type="payment.request",
+            order_id=uuid4(),
+            user_id=user_id,
+            amount=1,
+            created_at=datetime.now(timezone.utc).isoformat(),
+        )
+        order_ids.append(evt.order_id)
+        msg_ids.append(evt.event_id)
+        started = time.perf_counter()
+        async with SessionLocal() as session:
+            async with session.begin():
+                await process(session, evt, evt.event_id, evt.model_dump(mode="json"))
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _report(name: str, latencies: list[float]) -> None:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"{name:>4}: n={len(ms)} mean={statistics.mean(ms):.3f}ms p50={statistics.median(ms):.3f}ms p95={p95:.3f}ms")
+
+
+async def main(count: int, warmup: int, stripes: int) -> None:
+    user_id = 2_000_000_000 - (uuid4().int % 1_000_000)
+    order_ids: list = []
+    msg_ids: list = []
+    async with SessionLocal() as session:
+        async with session.begin():
+            await session.execute(insert(Account).values(id=uuid4(), user_id=user_id, balance=0, stripes=stripes))
+            await create_stripes(session, user_id, stripes)
+            for _ in range(stripes):
+                await credit(session, user_id, 10 * (count + warmup) + 10)
+    try:
+        for name in PATHS:
+            await _run_path(name, user_id, warmup, order_ids, msg_ids)
+        for name in PATHS:
+            _report(name, await _run_path(name, user_id, count, order_ids, msg_ids))
+    finally:
+        async with SessionLocal() as session:
+            async with session.begin():
+                await session.execute(
+                    text("DELETE FROM outbox_messages WHERE payload->>'order_id' = ANY(:ids)"),
+                    {"ids": [str(o) for o in order_ids]},
+                )
+                await session.execute(delete(Payment).where(Payment.order_id.in_(order_ids)))
+                await session.execute(delete(InboxMessage).where(InboxMessage.message_id.in_(msg_ids)))
+                await session.execute(delete(LedgerEntry).where(LedgerEntry.user_id == user_id))
+                await session.execute(delete(Account).where(Account.user_id == user_id))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--stripes", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.warmup, args.stripes))
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import text
+
+from payments.config import settings
+from payments.consumers import payment_request_pool
+from payments.db.session import SessionLocal
+from payments.dedup import inbox_dedup
+from payments.ledger import set_stripes
+from payments.metrics import batch_stats, inbox_stats, ledger_stats, outbox_stats, payment_path_stats, retention_stats
+from payments.outbox import list_parked, outbox_partition_status, requeue_parked
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+
+@router.get("/outbox/stats")
+async def get_outbox_stats():
+    return outbox_stats.snapshot()
+
+
+@router.get("/outbox/partitions")
+async def get_outbox_partitions():
+    return await outbox_partition_status(SessionLocal)
+
+
+@router.get("/retention/stats")
+async def get_retention_stats():
+    return retention_stats.snapshot()
+
+
+@router.get("/outbox/parked")
+async def get_parked_outbox(limit: int = Query(default=100, ge=1, le=1000)):
+    return await list_parked(SessionLocal, limit)
+
+
+@router.post("/outbox/parked/{message_id}/requeue")
+async def requeue_parked_outbox(message_id: UUID):
+    if not await requeue_parked(SessionLocal, message_id):
+        raise HTTPException(status_code=404, detail="Parked message not found")
+    return {"id": str(message_id), "requeued": True}
+
+
+@router.get("/inbox/stats")
+async def get_inbox_stats():
+    async with SessionLocal() as session:
+        row = (
+            await session.execute(
+                text(
+                    "SELECT pg_total_relation_size('inbox_messages') AS total_bytes,"
+                    " pg_indexes_size('inbox_messages') AS index_bytes,"
+                    " (SELECT reltuples::bigint FROM pg_class WHERE relname = 'inbox_messages') AS approx_rows"
+                )
+            )
+        ).one()
+    return {
+        **inbox_stats.snapshot(),
+        "cache_size": len(inbox_dedup),
+        "table": {"total_bytes": row.total_bytes, "index_bytes": row.index_bytes, "approx_rows": row.approx_rows},
+    }
+
+
+@router.get("/consumer/stats")
+async def get_consumer_stats():
+    return {
+        "pool": payment_request_pool.snapshot(),
+        "batch": batch_stats.snapshot(),
+        "transaction": payment_path_stats.snapshot(),
+    }
+
+
+@router.get("/ledger/stats")
+async def get_ledger_stats():
+    return ledger_stats.snapshot()
+
+
+@router.put("/accounts/{user_id}/stripes")
+async def put_account_stripes(user_id: int, count: int = Query(..., ge=1, le=settings.account_max_stripes)):
+    async with SessionLocal() as session:
+        async with session.begin():
+            total = await set_stripes(session, user_id, count)
+    if total is None:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return {"user_id": user_id, "stripes": count, "balance": total}
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, update
+from sqlalchemy import select
 
 from payments.api.deps import get_user_id
+from payments.config import settings
 from payments.db.session import SessionLocal
+from payments.ledger import create_stripes, credit, current_balance
 from payments.models.account import Account
 from payments.schemas import AccountResponse, BalanceResponse, TopUpRequest
 
@@ -18,8 +20,10 @@ async def create_account(user_id: int = Depends(get_user_id)):
             existing = (await session.execute(select(Account).where(Account.user_id == user_id))).scalar_one_or_none()
             if existing:
                 raise HTTPException(status_code=409, detail="Account already exists")
-            acc = Account(user_id=user_id, balance=0)
+            acc = Account(user_id=user_id, balance=0, stripes=settings.account_default_stripes)
             session.add(acc)
+            await session.flush()
+            await create_stripes(session, user_id, acc.stripes)
         return AccountResponse(user_id=user_id, balance=0)
 
 
@@ -27,23 +31,16 @@ async def create_account(user_id: int = Depends(get_user_id)):
 async def topup(payload: TopUpRequest, user_id: int = Depends(get_user_id)):
     async with SessionLocal() as session:
         async with session.begin():
-            # atomic add
-            res = await session.execute(
-                update(Account)
-                .where(Account.user_id == user_id)
-                .values(balance=Account.balance + payload.amount)
-                .returning(Account.balance)
-            )
-            new_balance = res.scalar_one_or_none()
-            if new_balance is None:
+            if not await credit(session, user_id, payload.amount):
                 raise HTTPException(status_code=404, detail="Account not found")
+            new_balance = await current_balance(session, user_id)
         return BalanceResponse(user_id=user_id, balance=int(new_balance))
 
 
 @router.get("/accounts/balance", response_model=BalanceResponse)
 async def balance(user_id: int = Depends(get_user_id)):
     async with SessionLocal() as session:
-        acc = (await session.execute(select(Account).where(Account.user_id == user_id))).scalar_one_or_none()
-        if not acc:
+        total = await current_balance(session, user_id)
+        if total is None:
             raise HTTPException(status_code=404, detail="Account not found")
-        return BalanceResponse(user_id=user_id, balance=acc.balance)
+        return BalanceResponse(user_id=user_id, balance=total)
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Dict, List, NamedTuple
+from uuid import UUID, uuid4
+
+from aio_pika.abc import AbstractIncomingMessage
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from payments.config import settings
+from payments.consumers import payment_result_event
+from payments.dedup import inbox_dedup
+from payments.ledger import Movement, allocate, apply_movements, lock_stripes
+from payments.metrics import batch_stats, inbox_stats
+from payments.models.inbox import InboxMessage
+from payments.models.outbox import OutboxMessage
+from payments.outbox import outbox_fast_path
+from payments.models.payment import Payment, PaymentStatus
+from payments.schemas import PaymentRequestEvent
+
+
+class _Item(NamedTuple):
+    message: AbstractIncomingMessage
+    msg_id: str
+    payload: dict
+    evt: PaymentRequestEvent
+
+
+async def payment_request_batch_consumer(session_factory: async_sessionmaker, rabbit, stop_event: asyncio.Event) -> None:
+    assert rabbit.channel is not None
+    queue = await rabbit.channel.declare_queue("payment_requests", durable=True)
+    buffer: asyncio.Queue[AbstractIncomingMessage] = asyncio.Queue()
+    consumer_tag = await queue.consume(buffer.put)
+
+    loop = asyncio.get_running_loop()
+    max_wait = settings.payment_batch_max_wait_ms / 1000
+    try:
+        while not stop_event.is_set():
+            batch = [await buffer.get()]
+            deadline = loop.time() + max_wait
+            while len(batch) < settings.payment_batch_max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(buffer.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await _handle_batch(batch, session_factory)
+            except Exception:
+                batch_stats.failed += 1
+    finally:
+        await queue.cancel(consumer_tag)
+
+
+async def _handle_batch(batch: List[AbstractIncomingMessage], session_factory: async_sessionmaker) -> None:
+    items: List[_Item] = []
+    for message in batch:
+        try:
+            payload = json.loads(message.body.decode("utf-8"))
+            evt = PaymentRequestEvent(**payload)
+        except Exception:
+            # Same outcome as the per-message path: process(requeue=True) on a bad body.
+            await message.reject(requeue=True)
+            continue
+        msg_id = message.message_id or evt.event_id
+        if msg_id in inbox_dedup:
+            inbox_stats.cache_hits += 1
+            continue
+        items.append(_Item(message, msg_id, payload, evt))
+
+    # This consumer owns every unacked delivery on the channel, so one multiple=True
+    # ack/nack on the highest tag settles the whole batch (rejected ones are already settled).
+    settled = [m for m in batch if not m.processed]
+    if not settled:
+        return
+    last = max(settled, key=lambda m: m.delivery_tag)
+
+    started = time.perf_counter()
+    inserted = 0
+    try:
+        if items:
+            async with session_factory() as session:
+                async with session.begin():
+                    inserted = await _process_payment_batch(session, items)
+    except Exception:
+        await last.nack(multiple=True, requeue=True)
+        raise
+    await last.ack(multiple=True)
+
+    batch_stats.batches += 1
+    batch_stats.messages += len(settled)
+    batch_stats.transaction.observe(time.perf_counter() - started)
+    inbox_stats.inserted += inserted
+    inbox_stats.db_duplicates += len(items) - inserted
+    for item in items:
+        inbox_dedup.add(item.msg_id)
+
+
+async def _process_payment_batch(session, items: List[_Item]) -> int:
+    """Settles the batch's new messages; returns how many were not already in the inbox."""
+    inserted = set(
+        (
+            await session.execute(
+                pg_insert(InboxMessage)
+                .values(
+                    [
+                        {"message_id": item.msg_id, "payload": item.payload if settings.inbox_store_payload else None}
+                        for item in items
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["message_id"])
+                .returning(InboxMessage.message_id)
+            )
+        ).scalars()
+    )
+    # A message already in the inbox (a redelivery whose ack was lost, or a repeat
+    # within this batch) was settled with its payment and result: skip it.
+    fresh: Dict[str, _Item] = {}
+    for item in items:
+        if item.msg_id in inserted:
+            fresh.setdefault(item.msg_id, item)
+    items = list(fresh.values())
+    if not items:
+        return 0
+
+    # Idempotency by order_id, both against earlier batches and within this one.
+    decided: Dict[UUID, Payment] = {
+        p.order_id: p
+        for p in (
+            await session.execute(select(Payment).where(Payment.order_id.in_({item.evt.order_id for item in items})))
+        ).scalars()
+    }
+
+    # Lock every stripe of every account of the batch up front, in a stable order,
+    # then decide debits in delivery order against the locked balances: no overdraft possible.
+    balances = await lock_stripes(session, {item.evt.user_id for item in items})
+    movements: List[Movement] = []
+    new_payments: List[Payment] = []
+    results: List[dict] = []
+
+    for item in items:
+        evt = item.evt
+        payment = decided.get(evt.order_id)
+        if payment is None:
+            parts = allocate(balances[evt.user_id], evt.amount) if evt.user_id in balances else None
+            if evt.user_id not in balances:
+                status, reason = PaymentStatus.FAILED, "Account not found"
+            elif parts is None:
+                status, reason = PaymentStatus.FAILED, "Insufficient funds"
+            else:
+                movements += [(evt.user_id, stripe, -take, evt.order_id) for stripe, take in parts]
+                status, reason = PaymentStatus.SUCCEEDED, None
+            payment = Payment(
+                id=uuid4(), order_id=evt.order_id, user_id=evt.user_id, amount=evt.amount, status=status, reason=reason
+            )
+            decided[evt.order_id] = payment
+            new_payments.append(payment)
+        results.append(payment_result_event(payment, payment.reason))
+
+    await apply_movements(session, movements, "debit")
+
+    if new_payments:
+        await session.execute(
+            insert(Payment).values(
+                [
+                    {
+                        "id": p.id,
+                        "order_id": p.order_id,
+                        "user_id": p.user_id,
+                        "amount": p.amount,
+                        "status": p.status,
+                        "reason": p.reason,
+                    }
+                    for p in new_payments
+                ]
+            )
+        )
+
+    outbox_ids = [uuid4() for _ in results]
+    await session.execute(
+        insert(OutboxMessage).values(
+            [
+                {
+                    "id": outbox_id,
+                    "exchange": settings.exchange_events,
+                    "routing_key": "payment.result",
+                    "payload": result_evt,
+                    "attempts": 0,
+                }
+                for outbox_id, result_evt in zip(outbox_ids, results)
+            ]
+        )
+    )
+    outbox_fast_path.track(session, outbox_ids)
+    return len(items)
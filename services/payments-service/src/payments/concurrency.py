@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set
+
+
+class KeyedWorkerPool:
+    """Runs handlers concurrently, at most `concurrency` at a time.
+
+    Handlers submitted with the same key run one after another, in submission
+    order, so they never compete for the same row lock.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.waiting_on_key = 0
+        self.processed = 0
+        self.failed = 0
+
+    def submit(self, key: Hashable, handler: Callable[[], Awaitable[None]]) -> None:
+        prev = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        task = asyncio.create_task(self._run(key, prev, done, handler))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self,
+        key: Hashable,
+        prev: asyncio.Future | None,
+        done: asyncio.Future,
+        handler: Callable[[], Awaitable[None]],
+    ) -> None:
+        try:
+            if prev is not None and not prev.done():
+                self.waiting_on_key += 1
+                try:
+                    await asyncio.wait([prev])
+                finally:
+                    self.waiting_on_key -= 1
+            async with self._slots:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    await handler()
+                    self.processed += 1
+                except Exception:
+                    self.failed += 1
+                finally:
+                    self.in_flight -= 1
+        finally:
+            done.set_result(None)
+            if self._tails.get(key) is done:
+                del self._tails[key]
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "pending": len(self._tasks),
+            "waiting_on_key": self.waiting_on_key,
+            "keys": len(self._tails),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
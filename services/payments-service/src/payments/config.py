@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,7 +12,53 @@ class Settings(BaseSettings):
     exchange_events: str = "gozon.events"
 
     outbox_poll_interval_sec: float = 1.0
+    # LISTEN/NOTIFY wakeup; the poll then only runs as a safety net.
+    outbox_notify_enabled: bool = True
+    outbox_safety_poll_interval_sec: float = 10.0
+    outbox_listener_keepalive_sec: float = 30.0
+    # Batch size adapts between min and max to the backlog; concurrency=1 publishes sequentially.
+    outbox_batch_size_min: int = 10
+    outbox_batch_size_max: int = 500
+    outbox_publish_concurrency: int = 100
+    # Publisher workers per process; outbox partitions are leased across all workers of all replicas.
+    outbox_workers_per_process: int = 4
+    outbox_lease_ttl_sec: float = 15.0
+    outbox_lease_renew_sec: float = 5.0
+    # Failed publishes back off exponentially; after max attempts the row is parked.
+    outbox_retry_base_sec: float = 1.0
+    outbox_retry_max_sec: float = 300.0
+    outbox_max_attempts: int = 10
+    # Publish outbox rows right after their transaction commits; the poller sweeps the rest.
+    outbox_fast_path_enabled: bool = False
+    outbox_fast_path_max_pending: int = 10_000
+    # Published outbox rows are pruned (or moved to outbox_messages_archive) after the TTL.
+    outbox_retention_enabled: bool = True
+    outbox_published_ttl_sec: float = 86400.0
+    outbox_archive_enabled: bool = False
+    outbox_archive_ttl_sec: float = 30 * 86400.0
+    # Inbox rows only guard against redelivery; keep them longer than any redelivery can take.
+    inbox_retention_sec: float = 7 * 86400.0
+    inbox_store_payload: bool = False
+    inbox_dedup_cache_size: int = 100_000
+    retention_interval_sec: float = 60.0
+    retention_batch_size: int = 1000
     consumer_prefetch: int = 10
+    # payment_requests handled concurrently; requests of one user_id stay serialized
+    # unless the user is split into lanes (useful with striped accounts).
+    payment_consumer_concurrency: int = 10
+    payment_user_lanes: int = 1
+    # "cte" settles a request in one statement; "orm" is the original multi-round-trip path.
+    payment_debit_mode: Literal["cte", "orm"] = "cte"
+    # Batch mode: gather up to N requests or wait T ms, then settle them in one transaction.
+    payment_batch_enabled: bool = False
+    payment_batch_max_size: int = 100
+    payment_batch_max_wait_ms: int = 20
+    # Balances live in per-account stripes so debits of a hot account do not queue on one row.
+    account_default_stripes: int = 1
+    account_max_stripes: int = 64
+    # accounts.balance is refreshed from the stripes of recently touched accounts.
+    ledger_rollup_interval_sec: float = 5.0
+    ledger_rollup_lookback_sec: float = 60.0
 
 
 settings = Settings()
@@ -2,85 +2,233 @@ from __future__ import annotations
 
 import asyncio
 import json
+import time
 from datetime import datetime, timezone
+from functools import partial
+from typing import Any
 from uuid import uuid4
 
 from aio_pika.abc import AbstractIncomingMessage
-from sqlalchemy import select, update
+from sqlalchemy import select, text
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
+from payments.concurrency import KeyedWorkerPool
 from payments.config import settings
+from payments.dedup import inbox_dedup
+from payments.ledger import debit
+from payments.metrics import inbox_stats, ledger_stats, payment_path_stats
 from payments.models.account import Account
 from payments.models.inbox import InboxMessage
 from payments.models.outbox import OutboxMessage
+from payments.outbox import outbox_fast_path
 from payments.models.payment import Payment, PaymentStatus
 from payments.schemas import PaymentRequestEvent
 
 
+payment_request_pool = KeyedWorkerPool(settings.payment_consumer_concurrency)
+
+
 async def payment_request_consumer(session_factory: async_sessionmaker, rabbit, stop_event: asyncio.Event) -> None:
     assert rabbit.channel is not None
     queue = await rabbit.channel.declare_queue("payment_requests", durable=True)
 
-    async with queue.iterator() as qiter:
-        async for message in qiter:
-            if stop_event.is_set():
-                break
-            await _handle_payment_request(message, session_factory)
+    try:
+        async with queue.iterator() as qiter:
+            async for message in qiter:
+                if stop_event.is_set():
+                    break
+                payload = _decode(message)
+                payment_request_pool.submit(
+                    _pool_key(payload, message.delivery_tag),
+                    partial(_handle_payment_request, message, payload, session_factory),
+                )
+    finally:
+        await payment_request_pool.drain()
+
+
+def _pool_key(payload: Any, fallback: int) -> Any:
+    # Requests of one user are serialized so they do not queue up on the same
+    # balance rows; different users are processed concurrently. A striped account
+    # can take PAYMENT_USER_LANES requests of one user at a time.
+    user_id = payload.get("user_id") if isinstance(payload, dict) else None
+    if user_id is None:
+        return fallback
+    if settings.payment_user_lanes <= 1:
+        return user_id
+    return user_id, hash(payload.get("order_id")) % settings.payment_user_lanes
 
 
-async def _handle_payment_request(message: AbstractIncomingMessage, session_factory: async_sessionmaker) -> None:
+def _decode(message: AbstractIncomingMessage) -> Any:
+    try:
+        return json.loads(message.body.decode("utf-8"))
+    except Exception:
+        return None
+
+
+async def _handle_payment_request(message: AbstractIncomingMessage, payload: Any, session_factory: async_sessionmaker) -> None:
     async with message.process(requeue=True):
-        payload = json.loads(message.body.decode("utf-8"))
         evt = PaymentRequestEvent(**payload)
 
         msg_id = message.message_id or evt.event_id
+        if msg_id in inbox_dedup:
+            # Already committed together with its payment and outbox result.
+            inbox_stats.cache_hits += 1
+            return
 
+        process = _process_payment_request_cte if settings.payment_debit_mode == "cte" else _process_payment_request
+        started = time.perf_counter()
         async with session_factory() as session:
             async with session.begin():
-                # Transactional Inbox (by message_id)
-                stmt = pg_insert(InboxMessage).values(message_id=msg_id, payload=payload).on_conflict_do_nothing(
-                    index_elements=["message_id"]
-                )
-                await session.execute(stmt)
-
-                # Idempotency by order_id (effectively exactly once)
-                existing = (await session.execute(select(Payment).where(Payment.order_id == evt.order_id))).scalar_one_or_none()
-                if existing:
-                    await _enqueue_result(session, existing, evt, reason=existing.reason)
-                    return
-
-                acc = (await session.execute(select(Account).where(Account.user_id == evt.user_id))).scalar_one_or_none()
-                if not acc:
-                    payment = Payment(order_id=evt.order_id, user_id=evt.user_id, amount=evt.amount, status=PaymentStatus.FAILED, reason="Account not found")
-                    session.add(payment)
-                    await session.flush()
-                    await _enqueue_result(session, payment, evt, reason=payment.reason)
-                    return
-
-                res = await session.execute(
-                    update(Account)
-                    .where(Account.user_id == evt.user_id, Account.balance >= evt.amount)
-                    .values(balance=Account.balance - evt.amount)
-                    .returning(Account.balance)
-                )
-                new_balance = res.scalar_one_or_none()
-
-                if new_balance is None:
-                    payment = Payment(order_id=evt.order_id, user_id=evt.user_id, amount=evt.amount, status=PaymentStatus.FAILED, reason="Insufficient funds")
-                    session.add(payment)
-                    await session.flush()
-                    await _enqueue_result(session, payment, evt, reason=payment.reason)
-                    return
-
-                payment = Payment(order_id=evt.order_id, user_id=evt.user_id, amount=evt.amount, status=PaymentStatus.SUCCEEDED, reason=None)
-                session.add(payment)
-                await session.flush()
-                await _enqueue_result(session, payment, evt, reason=None)
-
-
-async def _enqueue_result(session, payment: Payment, request_evt: PaymentRequestEvent, reason: str | None) -> None:
-    result_evt = {
+                await process(session, evt, msg_id, payload)
+        payment_path_stats.observe(settings.payment_debit_mode, time.perf_counter() - started)
+        inbox_stats.inserted += 1
+        inbox_dedup.add(msg_id)
+
+
+# Inbox insert, order_id dedup, conditional debit, payment insert and outbox insert
+# in one statement. No ON CONFLICT on payments: a concurrent duplicate must fail
+# with a unique violation (and be redelivered) rather than keep its debit.
+# The debit takes one free stripe that covers the amount; when there is none but
+# the account total would do (`spread`), nothing is written past the inbox and
+# the caller settles the request on the ORM path.
+_PAYMENT_REQUEST_CTE = text(
+    """
+    WITH inbox AS (
+        INSERT INTO inbox_messages (message_id, payload)
+        VALUES (CAST(:message_id AS varchar), CAST(:inbox_payload AS jsonb))
+        ON CONFLICT (message_id) DO NOTHING
+    ),
+    existing AS (
+        SELECT order_id, user_id, amount, status, reason FROM payments WHERE order_id = CAST(:order_id AS uuid)
+    ),
+    account AS (
+        SELECT user_id FROM accounts WHERE user_id = CAST(:user_id AS integer)
+    ),
+    debit AS (
+        UPDATE account_stripes SET balance = balance - CAST(:amount AS integer), updated_at = now()
+        WHERE user_id = CAST(:user_id AS integer)
+          AND NOT EXISTS (SELECT 1 FROM existing)
+          AND stripe = (
+              SELECT stripe FROM account_stripes
+              WHERE user_id = CAST(:user_id AS integer) AND balance >= CAST(:amount AS integer)
+              ORDER BY balance DESC
+              LIMIT 1
+              FOR UPDATE SKIP LOCKED
+          )
+        RETURNING stripe
+    ),
+    ledger AS (
+        INSERT INTO account_ledger (user_id, stripe, amount, kind, order_id)
+        SELECT CAST(:user_id AS integer), stripe, -CAST(:amount AS integer), 'debit', CAST(:order_id AS uuid) FROM debit
+    ),
+    spread AS (
+        SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM existing)
+          AND NOT EXISTS (SELECT 1 FROM debit)
+          AND (SELECT sum(balance) FROM account_stripes WHERE user_id = CAST(:user_id AS integer)) >= CAST(:amount AS integer)
+    ),
+    new_payment AS (
+        INSERT INTO payments (id, order_id, user_id, amount, status, reason)
+        SELECT CAST(:payment_id AS uuid), CAST(:order_id AS uuid), CAST(:user_id AS integer), CAST(:amount AS integer),
+               CASE WHEN EXISTS (SELECT 1 FROM debit) THEN 'SUCCEEDED' ELSE 'FAILED' END::payment_status,
+               CASE WHEN EXISTS (SELECT 1 FROM debit) THEN NULL
+                    WHEN EXISTS (SELECT 1 FROM account) THEN 'Insufficient funds'
+                    ELSE 'Account not found' END
+        WHERE NOT EXISTS (SELECT 1 FROM existing) AND NOT EXISTS (SELECT 1 FROM spread)
+        RETURNING order_id, user_id, amount, status, reason
+    ),
+    result AS (
+        SELECT * FROM new_payment
+        UNION ALL
+        SELECT * FROM existing
+    )
+    INSERT INTO outbox_messages (id, exchange, routing_key, payload, attempts)
+    SELECT CAST(:outbox_id AS uuid), CAST(:exchange AS varchar), 'payment.result',
+           jsonb_build_object(
+               'event_id', CAST(:event_id AS text),
+               'type', 'payment.result',
+               'order_id', result.order_id::text,
+               'user_id', result.user_id,
+               'amount', result.amount,
+               'status', result.status::text,
+               'reason', result.reason,
+               'processed_at', CAST(:processed_at AS text)
+           ),
+           0
+    FROM result
+    RETURNING payload->>'status', EXISTS (SELECT 1 FROM debit) AS debited
+    """
+)
+
+
+async def _process_payment_request_cte(session, evt: PaymentRequestEvent, msg_id: str, payload: dict) -> None:
+    outbox_id = uuid4()
+    row = (
+        await session.execute(
+            _PAYMENT_REQUEST_CTE,
+            {
+                "message_id": msg_id,
+                "inbox_payload": json.dumps(payload) if settings.inbox_store_payload else None,
+                "order_id": str(evt.order_id),
+                "user_id": evt.user_id,
+                "amount": evt.amount,
+                "payment_id": str(uuid4()),
+                "outbox_id": str(outbox_id),
+                "exchange": settings.exchange_events,
+                "event_id": str(uuid4()),
+                "processed_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+    ).one_or_none()
+    if row is None:
+        await _process_payment_request(session, evt, msg_id, payload)
+        return
+    outbox_fast_path.track(session, [outbox_id])
+    status, debited = row
+    if status not in (PaymentStatus.SUCCEEDED.value, PaymentStatus.FAILED.value):
+        raise RuntimeError(f"Unexpected payment status {status!r}")
+    if debited:
+        ledger_stats.single_stripe_debits += 1
+
+
+async def _process_payment_request(session, evt: PaymentRequestEvent, msg_id: str, payload: dict) -> None:
+    # Transactional Inbox (by message_id)
+    started = time.perf_counter()
+    stmt = pg_insert(InboxMessage).values(
+        message_id=msg_id, payload=payload if settings.inbox_store_payload else None
+    ).on_conflict_do_nothing(index_elements=["message_id"])
+    await session.execute(stmt)
+    inbox_stats.insert.observe(time.perf_counter() - started)
+
+    # Idempotency by order_id (effectively exactly once)
+    existing = (await session.execute(select(Payment).where(Payment.order_id == evt.order_id))).scalar_one_or_none()
+    if existing:
+        await _enqueue_result(session, existing, evt, reason=existing.reason)
+        return
+
+    acc = (await session.execute(select(Account).where(Account.user_id == evt.user_id))).scalar_one_or_none()
+    if not acc:
+        payment = Payment(order_id=evt.order_id, user_id=evt.user_id, amount=evt.amount, status=PaymentStatus.FAILED, reason="Account not found")
+        session.add(payment)
+        await session.flush()
+        await _enqueue_result(session, payment, evt, reason=payment.reason)
+        return
+
+    if not await debit(session, evt.user_id, evt.amount, evt.order_id):
+        payment = Payment(order_id=evt.order_id, user_id=evt.user_id, amount=evt.amount, status=PaymentStatus.FAILED, reason="Insufficient funds")
+        session.add(payment)
+        await session.flush()
+        await _enqueue_result(session, payment, evt, reason=payment.reason)
+        return
+
+    payment = Payment(order_id=evt.order_id, user_id=evt.user_id, amount=evt.amount, status=PaymentStatus.SUCCEEDED, reason=None)
+    session.add(payment)
+    await session.flush()
+    await _enqueue_result(session, payment, evt, reason=None)
+
+
+def payment_result_event(payment: Payment, reason: str | None) -> dict:
+    return {
         "event_id": str(uuid4()),
         "type": "payment.result",
         "order_id": str(payment.order_id),
@@ -90,10 +238,17 @@ async def _enqueue_result(session, payment: Payment, request_evt: PaymentRequest
         "reason": reason,
         "processed_at": datetime.now(timezone.utc).isoformat(),
     }
+
+
+async def _enqueue_result(session, payment: Payment, request_evt: PaymentRequestEvent, reason: str | None) -> None:
+    result_evt = payment_result_event(payment, reason)
+    outbox_id = uuid4()
     session.add(
         OutboxMessage(
+            id=outbox_id,
             exchange=settings.exchange_events,
             routing_key="payment.result",
             payload=result_evt,
         )
     )
+    outbox_fast_path.track(session, [outbox_id])
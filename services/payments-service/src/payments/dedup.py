@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+
+from payments.config import settings
+
+
+class DedupCache:
+    """Bounded LRU of message ids already committed to the inbox.
+
+    Only a fast path: a miss still goes through INSERT ... ON CONFLICT, so the
+    inbox table stays the source of truth.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._ids: OrderedDict[str, None] = OrderedDict()
+
+    def __contains__(self, message_id: str) -> bool:
+        if message_id in self._ids:
+            self._ids.move_to_end(message_id)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, message_id: str) -> None:
+        if self._max_size <= 0:
+            return
+        self._ids[message_id] = None
+        self._ids.move_to_end(message_id)
+        while len(self._ids) > self._max_size:
+            self._ids.popitem(last=False)
+
+
+inbox_dedup = DedupCache(settings.inbox_dedup_cache_size)
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+from sqlalchemy import Integer, column, delete, func, insert, literal, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from payments.config import settings
+from payments.metrics import ledger_stats
+from payments.models.account import Account
+from payments.models.ledger import AccountStripe, LedgerEntry
+
+# (user_id, stripe, signed amount, order_id)
+Movement = Tuple[int, int, int, UUID | None]
+
+_ROLLUP_LOCK_KEY = 0x6C656467  # "ledg"
+
+
+def allocate(balances: Dict[int, int], amount: int) -> List[Tuple[int, int]] | None:
+    """Takes `amount` from the fullest stripes first, updating `balances`; None if the total is short."""
+    if sum(balances.values()) < amount:
+        return None
+    parts: List[Tuple[int, int]] = []
+    for stripe in sorted(balances, key=balances.__getitem__, reverse=True):
+        if amount <= 0:
+            break
+        take = min(balances[stripe], amount)
+        if take > 0:
+            balances[stripe] -= take
+            parts.append((stripe, take))
+            amount -= take
+    return parts
+
+
+async def apply_movements(session, movements: List[Movement], kind: str) -> None:
+    """Applies movements to stripes the caller has locked and appends them to the ledger."""
+    if not movements:
+        return
+    deltas: Dict[Tuple[int, int], int] = {}
+    for user_id, stripe, amount, _ in movements:
+        deltas[(user_id, stripe)] = deltas.get((user_id, stripe), 0) + amount
+
+    v = values(column("user_id", Integer), column("stripe", Integer), column("delta", Integer), name="v").data(
+        [(user_id, stripe, delta) for (user_id, stripe), delta in deltas.items()]
+    )
+    res = await session.execute(
+        update(AccountStripe)
+        .where(
+            AccountStripe.user_id == v.c.user_id,
+            AccountStripe.stripe == v.c.stripe,
+            AccountStripe.balance + v.c.delta >= 0,
+        )
+        .values(balance=AccountStripe.balance + v.c.delta)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount != len(deltas):
+        raise RuntimeError("Ledger movement did not apply to every stripe")
+
+    await session.execute(
+        insert(LedgerEntry).values(
+            [
+                {"user_id": user_id, "stripe": stripe, "amount": amount, "kind": kind, "order_id": order_id}
+                for user_id, stripe, amount, order_id in movements
+            ]
+        )
+    )
+
+
+async def lock_stripes(session, user_ids) -> Dict[int, Dict[int, int]]:
+    """Locks every stripe of the given accounts in (user_id, stripe) order and returns their balances."""
+    # KEY SHARE on the accounts waits out a concurrent restripe, so the stripe
+    # set read below is the committed one.
+    await session.execute(
+        select(Account.user_id)
+        .where(Account.user_id.in_(user_ids))
+        .order_by(Account.user_id)
+        .with_for_update(read=True, key_share=True)
+    )
+    rows = await session.execute(
+        select(AccountStripe.user_id, AccountStripe.stripe, AccountStripe.balance)
+        .where(AccountStripe.user_id.in_(user_ids))
+        .order_by(AccountStripe.user_id, AccountStripe.stripe)
+        .with_for_update()
+    )
+    balances: Dict[int, Dict[int, int]] = {}
+    for user_id, stripe, balance in rows.all():
+        balances.setdefault(user_id, {})[stripe] = balance
+    return balances
+
+
+async def debit(session, user_id: int, amount: int, order_id: UUID) -> bool:
+    """Debits an existing account without overdraft; False on insufficient funds."""
+    # One stripe that covers the amount and is not held by a concurrent debit:
+    # debits of the same account land on different rows and do not wait.
+    pick = (
+        select(AccountStripe.stripe)
+        .where(AccountStripe.user_id == user_id, AccountStripe.balance >= amount)
+        .order_by(AccountStripe.balance.desc())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    debited = (
+        update(AccountStripe)
+        .where(AccountStripe.user_id == user_id, AccountStripe.stripe == pick)
+        .values(balance=AccountStripe.balance - amount)
+        .returning(AccountStripe.stripe)
+        .cte("debited")
+    )
+    stripe = (
+        await session.execute(
+            insert(LedgerEntry)
+            .from_select(
+                ["user_id", "stripe", "amount", "kind", "order_id"],
+                select(
+                    literal(user_id),
+                    debited.c.stripe,
+                    literal(-amount),
+                    literal("debit"),
+                    literal(order_id, LedgerEntry.order_id.type),
+                ),
+            )
+            .returning(LedgerEntry.stripe)
+        )
+    ).scalar_one_or_none()
+    if stripe is not None:
+        ledger_stats.single_stripe_debits += 1
+        return True
+
+    # Every covering stripe is busy or none covers the amount alone: lock them all
+    # and take the amount from several.
+    balances = (await lock_stripes(session, [user_id])).get(user_id, {})
+    parts = allocate(balances, amount)
+    if parts is None:
+        ledger_stats.insufficient += 1
+        return False
+    await apply_movements(session, [(user_id, s, -take, order_id) for s, take in parts], "debit")
+    ledger_stats.spread_debits += 1
+    return True
+
+
+async def credit(session, user_id: int, amount: int, kind: str = "topup") -> bool:
+    stripes = (
+        await session.execute(
+            select(Account.stripes).where(Account.user_id == user_id).with_for_update(read=True, key_share=True)
+        )
+    ).scalar_one_or_none()
+    if stripes is None:
+        return False
+    # Spread credits so that every stripe can serve debits on its own.
+    await apply_movements(session, [(user_id, random.randrange(stripes), amount, None)], kind)
+    ledger_stats.credits += 1
+    return True
+
+
+async def create_stripes(session, user_id: int, count: int) -> None:
+    await session.execute(
+        insert(AccountStripe).values([{"user_id": user_id, "stripe": s, "balance": 0} for s in range(count)])
+    )
+
+
+async def current_balance(session, user_id: int) -> int | None:
+    # A single statement reads all stripes from one snapshot, so the total is consistent.
+    total = (
+        await session.execute(select(func.sum(AccountStripe.balance)).where(AccountStripe.user_id == user_id))
+    ).scalar_one()
+    return None if total is None else int(total)
+
+
+async def set_stripes(session, user_id: int, count: int) -> int | None:
+    """Re-splits the balance evenly over `count` stripes; returns the total, None if there is no account."""
+    acc = (await session.execute(select(Account).where(Account.user_id == user_id).with_for_update())).scalar_one_or_none()
+    if acc is None:
+        return None
+    balances = (await lock_stripes(session, [user_id])).get(user_id, {})
+    total = sum(balances.values())
+
+    new = [s for s in range(count) if s not in balances]
+    if new:
+        await session.execute(
+            pg_insert(AccountStripe)
+            .values([{"user_id": user_id, "stripe": s, "balance": 0} for s in new])
+            .on_conflict_do_nothing(index_elements=["user_id", "stripe"])
+        )
+    targets = {s: total // count + (1 if s < total % count else 0) for s in range(count)}
+    await apply_movements(
+        session,
+        [
+            (user_id, s, targets.get(s, 0) - balances.get(s, 0), None)
+            for s in sorted(set(balances) | set(targets))
+            if targets.get(s, 0) != balances.get(s, 0)
+        ],
+        "transfer",
+    )
+    await session.execute(delete(AccountStripe).where(AccountStripe.user_id == user_id, AccountStripe.stripe >= count))
+    acc.stripes = count
+    return total
+
+
+async def rollup_balances(session_factory: async_sessionmaker, since: datetime | None) -> int:
+    """Copies stripe totals into accounts.balance for accounts with ledger entries since `since` (all if None)."""
+    async with session_factory() as session:
+        async with session.begin():
+            # One replica at a time: two bulk UPDATEs over the same accounts could deadlock.
+            if not (await session.execute(select(func.pg_try_advisory_xact_lock(_ROLLUP_LOCK_KEY)))).scalar_one():
+                return 0
+            totals = select(AccountStripe.user_id, func.sum(AccountStripe.balance).label("total")).group_by(
+                AccountStripe.user_id
+            )
+            if since is not None:
+                totals = totals.where(
+                    AccountStripe.user_id.in_(select(LedgerEntry.user_id).where(LedgerEntry.created_at >= since))
+                )
+            totals = totals.subquery("totals")
+            res = await session.execute(
+                update(Account)
+                .where(Account.user_id == totals.c.user_id, Account.balance != totals.c.total)
+                .values(balance=totals.c.total)
+                .execution_options(synchronize_session=False)
+            )
+    return res.rowcount
+
+
+async def ledger_rollup_loop(session_factory: async_sessionmaker, stop_event: asyncio.Event) -> None:
+    last_run: datetime | None = None
+    while not stop_event.is_set():
+        run_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            # Entries carry their transaction start time, so look back far enough to
+            # catch transactions that committed after the previous run.
+            since = last_run - timedelta(seconds=settings.ledger_rollup_lookback_sec) if last_run else None
+            ledger_stats.rolled_up_accounts += await rollup_balances(session_factory, since)
+            ledger_stats.rollups += 1
+            ledger_stats.rollup.observe(time.perf_counter() - started)
+            last_run = run_at
+        except Exception:
+            pass
+        await asyncio.sleep(settings.ledger_rollup_interval_sec)
@@ -5,11 +5,16 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from payments.api.internal import router as internal_router
 from payments.api.routes import router as accounts_router
+from payments.batch_consumer import payment_request_batch_consumer
+from payments.config import settings
 from payments.consumers import payment_request_consumer
 from payments.db.session import SessionLocal
+from payments.ledger import ledger_rollup_loop
 from payments.messaging.rabbit import Rabbit
-from payments.outbox import outbox_publisher_loop
+from payments.outbox import OutboxListener, outbox_fast_path, outbox_publisher_loop, outbox_worker_id
+from payments.retention import retention_loop
 
 rabbit = Rabbit()
 
@@ -17,19 +22,40 @@ rabbit = Rabbit()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await rabbit.connect()
+    if settings.outbox_fast_path_enabled:
+        outbox_fast_path.start(SessionLocal, rabbit)
+    listener = OutboxListener(settings.database_url) if settings.outbox_notify_enabled else None
+    if listener:
+        listener.start()
     stop = asyncio.Event()
     tasks = [
-        asyncio.create_task(outbox_publisher_loop(SessionLocal, rabbit, stop)),
-        asyncio.create_task(payment_request_consumer(SessionLocal, rabbit, stop)),
+        asyncio.create_task(outbox_publisher_loop(SessionLocal, rabbit, stop, listener, outbox_worker_id(i)))
+        for i in range(settings.outbox_workers_per_process)
     ]
+    tasks += [
+        asyncio.create_task(
+            (payment_request_batch_consumer if settings.payment_batch_enabled else payment_request_consumer)(
+                SessionLocal, rabbit, stop
+            )
+        ),
+    ]
+    tasks.append(asyncio.create_task(ledger_rollup_loop(SessionLocal, stop)))
+    if settings.outbox_retention_enabled:
+        tasks.append(asyncio.create_task(retention_loop(SessionLocal, stop)))
     try:
         yield
     finally:
         stop.set()
         for t in tasks:
             t.cancel()
+        # Let publisher workers hand their partition leases back.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if listener:
+            await listener.stop()
+        await outbox_fast_path.stop()
         await rabbit.close()
 
 
 app = FastAPI(title="Payments Service", version="1.0.0", lifespan=lifespan)
 app.include_router(accounts_router)
+app.include_router(internal_router)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List, Sequence
 
 import aio_pika
 from aio_pika import DeliveryMode, ExchangeType, Message, RobustChannel, RobustConnection
@@ -18,7 +19,11 @@ class Rabbit:
     async def connect(self) -> None:
         self.connection = await aio_pika.connect_robust(settings.rabbitmq_url)
         self.channel = await self.connection.channel(publisher_confirms=True)
-        await self.channel.set_qos(prefetch_count=settings.consumer_prefetch)
+        # Concurrent handlers (or a full batch) need at least that many unacked deliveries.
+        prefetch = max(settings.consumer_prefetch, settings.payment_consumer_concurrency)
+        if settings.payment_batch_enabled:
+            prefetch = max(prefetch, settings.payment_batch_max_size)
+        await self.channel.set_qos(prefetch_count=prefetch)
 
         self.exchange_events = await self.channel.declare_exchange(
             settings.exchange_events, ExchangeType.DIRECT, durable=True
@@ -43,3 +48,15 @@ class Rabbit:
             content_type="application/json",
         )
         await self.exchange_events.publish(msg, routing_key=routing_key)
+
+    async def publish_many(self, items: Sequence[Dict[str, Any]]) -> List[BaseException | None]:
+        """Publishes items (``publish`` kwargs) concurrently; returns None or the error per item."""
+        # Publishes start in item order, so frames reach the broker in that order.
+        sem = asyncio.Semaphore(max(1, settings.outbox_publish_concurrency))
+
+        async def _one(item: Dict[str, Any]) -> None:
+            async with sem:
+                await self.publish(**item)
+
+        results = await asyncio.gather(*(_one(item) for item in items), return_exceptions=True)
+        return [r if isinstance(r, BaseException) else None for r in results]
@@ -1,6 +1,9 @@
 from payments.models.account import Account
+from payments.models.ledger import AccountStripe, LedgerEntry
 from payments.models.payment import Payment, PaymentStatus
-from payments.models.outbox import OutboxMessage
+from payments.models.outbox import OUTBOX_PARTITIONS, OutboxMessage
+from payments.models.outbox_archive import OutboxArchiveMessage
+from payments.models.outbox_partition import OutboxPartition, OutboxWorker
 from payments.models.inbox import InboxMessage
 
-__all__ = ["Account", "Payment", "PaymentStatus", "OutboxMessage", "InboxMessage"]
+__all__ = ["Account", "AccountStripe", "LedgerEntry", "Payment", "PaymentStatus", "OutboxMessage", "OUTBOX_PARTITIONS", "OutboxArchiveMessage", "OutboxPartition", "OutboxWorker", "InboxMessage"]
@@ -16,7 +16,9 @@ class Account(Base):
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    # Rolled up from account_stripes periodically; the live balance is the sum of the stripes.
     balance: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    stripes: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
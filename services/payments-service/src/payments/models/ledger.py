@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, CheckConstraint, DateTime, ForeignKey, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from payments.db.base import Base
+
+
+# One slice of an account balance; the spendable balance is the sum of the stripes.
+class AccountStripe(Base):
+    __tablename__ = "account_stripes"
+    __table_args__ = (CheckConstraint("balance >= 0", name="ck_account_stripes_balance_non_negative"),)
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.user_id", ondelete="CASCADE"), primary_key=True)
+    stripe: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    balance: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+# Append-only record of every balance movement; amount is signed.
+class LedgerEntry(Base):
+    __tablename__ = "account_ledger"
+    __table_args__ = (
+        Index("ix_account_ledger_user_id_id", "user_id", "id"),
+        Index("ix_account_ledger_created_at", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    stripe: Mapped[int] = mapped_column(Integer, nullable=False)
+    amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    # opening | topup | debit | transfer
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    order_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from payments.config import settings
+from payments.metrics import retention_stats
+from payments.models.inbox import InboxMessage
+from payments.models.outbox import OutboxMessage
+from payments.models.outbox_archive import OutboxArchiveMessage
+
+_ARCHIVED_COLUMNS = ["id", "exchange", "routing_key", "payload", "attempts", "created_at", "published_at"]
+
+
+async def _prune_published_outbox(session_factory: async_sessionmaker, cutoff: datetime) -> int:
+    batch = (
+        select(OutboxMessage.id)
+        .where(OutboxMessage.published_at < cutoff)
+        .order_by(OutboxMessage.published_at)
+        .limit(settings.retention_batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with session_factory() as session:
+        async with session.begin():
+            if settings.outbox_archive_enabled:
+                moved = (
+                    delete(OutboxMessage)
+                    .where(OutboxMessage.id.in_(batch))
+                    .returning(*(getattr(OutboxMessage, c) for c in _ARCHIVED_COLUMNS))
+                    .cte("moved")
+                )
+                result = await session.execute(
+                    insert(OutboxArchiveMessage)
+                    .from_select(_ARCHIVED_COLUMNS, select(*(moved.c[c] for c in _ARCHIVED_COLUMNS)))
+                    .returning(OutboxArchiveMessage.id)
+                )
+                count = len(result.all())
+                retention_stats.outbox_archived += count
+            else:
+                result = await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(batch)).returning(OutboxMessage.id))
+                count = len(result.all())
+                retention_stats.outbox_pruned += count
+    return count
+
+
+async def _prune_archive(session_factory: async_sessionmaker, cutoff: datetime) -> int:
+    batch = (
+        select(OutboxArchiveMessage.id)
+        .where(OutboxArchiveMessage.archived_at < cutoff)
+        .limit(settings.retention_batch_size)
+        .scalar_subquery()
+    )
+    async with session_factory() as session:
+        async with session.begin():
+            result = await session.execute(
+                delete(OutboxArchiveMessage).where(OutboxArchiveMessage.id.in_(batch)).returning(OutboxArchiveMessage.id)
+            )
+            count = len(result.all())
+    retention_stats.archive_pruned += count
+    return count
+
+
+async def _prune_inbox(session_factory: async_sessionmaker, cutoff: datetime) -> int:
+    batch = (
+        select(InboxMessage.message_id)
+        .where(InboxMessage.received_at < cutoff)
+        .limit(settings.retention_batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with session_factory() as session:
+        async with session.begin():
+            result = await session.execute(
+                delete(InboxMessage).where(InboxMessage.message_id.in_(batch)).returning(InboxMessage.message_id)
+            )
+            count = len(result.all())
+    retention_stats.inbox_pruned += count
+    return count
+
+
+async def _drain(step: Callable[[], Awaitable[int]], stop_event: asyncio.Event) -> None:
+    # Bounded batches keep every transaction short; yield between them so the
+    # publishers are not starved on a large backlog.
+    while not stop_event.is_set():
+        if await step() < settings.retention_batch_size:
+            return
+        await asyncio.sleep(0.05)
+
+
+async def run_retention(session_factory: async_sessionmaker, stop_event: asyncio.Event) -> None:
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    outbox_cutoff = now - timedelta(seconds=settings.outbox_published_ttl_sec)
+    archive_cutoff = now - timedelta(seconds=settings.outbox_archive_ttl_sec)
+    inbox_cutoff = now - timedelta(seconds=settings.inbox_retention_sec)
+
+    await _drain(lambda: _prune_published_outbox(session_factory, outbox_cutoff), stop_event)
+    await _drain(lambda: _prune_archive(session_factory, archive_cutoff), stop_event)
+    await _drain(lambda: _prune_inbox(session_factory, inbox_cutoff), stop_event)
+
+    retention_stats.runs += 1
+    retention_stats.last_run.observe(time.perf_counter() - started)
+
+
+async def retention_loop(session_factory: async_sessionmaker, stop_event: asyncio.Event) -> None:
+    while not stop_event.is_set():
+        try:
+            await run_retention(session_factory, stop_event)
+        except Exception:
+            pass
+        await asyncio.sleep(settings.retention_interval_sec)